@@ -0,0 +1,215 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+
+from administration.models import CommissionRollup
+from payments.models import Movement
+from stores.models import Purchase
+from stores.api.schedules import CARACAS_TIMEZONE, caracas_now
+
+# Days re-rolled by the nightly task, so purchases that change after their
+# day was rolled up (e.g. gifts expired and then rejected) are moved over
+ROLLUP_LOOKBACK_DAYS = 3
+
+
+def day_start(day):
+    "Start of `day` in Caracas time"
+    return CARACAS_TIMEZONE.localize(datetime.combine(day, time.min))
+
+
+def get_commission_sources(now):
+    """
+    Returns, for every commission source, the rows earning it, the datetime
+    field that dates them and the path from those rows to their purchase.
+
+    Settled purchases belong to the day they were paid, refunded ones to the
+    day their refund movement was written and expired gifts to the day they
+    expired.
+    """
+    Source = CommissionRollup.Source
+    return {
+        Source.SETTLED: (
+            Purchase.objects.exclude(store_payment=None),
+            "store_payment__created_at",
+            "",
+        ),
+        Source.REFUNDED: (
+            Movement.objects.filter(
+                movement_type=Movement.Type.GIFT_REFUNDED,
+                purchase__status=Purchase.Status.REJECTED,
+            ),
+            "created_at",
+            "purchase__",
+        ),
+        Source.EXPIRED: (
+            Purchase.objects.filter(
+                status=Purchase.Status.PENDING, gift_expiration_date__lte=now
+            ),
+            "gift_expiration_date",
+            "",
+        ),
+    }
+
+
+def calculate_commissions(start_day=None, end_day=None, now=None):
+    """
+    Calculates from the purchases the commissions earned each day between
+    `start_day` and `end_day`, both included, by store and source. Returns
+    (day, store_id, source, amount) tuples.
+    """
+    if now is None:
+        now = caracas_now()
+
+    commissions = []
+    for source, (rows, date_field, purchase) in get_commission_sources(now).items():
+        if start_day is not None:
+            rows = rows.filter(**{f"{date_field}__gte": day_start(start_day)})
+
+        if end_day is not None:
+            end = day_start(end_day + timedelta(days=1))
+            rows = rows.filter(**{f"{date_field}__lt": end})
+
+        commission = F(f"{purchase}amount") * F(f"{purchase}commission_percentage")
+        totals = (
+            rows.order_by()
+            .annotate(
+                day=TruncDate(date_field, tzinfo=CARACAS_TIMEZONE),
+                commission_store=F(f"{purchase}store"),
+            )
+            .values("day", "commission_store")
+            .annotate(total=Sum(commission))
+        )
+        for total in totals:
+            commissions.append(
+                (total["day"], total["commission_store"], source, total["total"])
+            )
+
+    return commissions
+
+
+def get_first_commission_day(now=None):
+    "The first day any commission was earned, None when there are none yet"
+    if now is None:
+        now = caracas_now()
+
+    first_dates = []
+    for rows, date_field, _ in get_commission_sources(now).values():
+        first_date = rows.aggregate(first=Min(date_field))["first"]
+        if first_date is not None:
+            first_dates.append(first_date.astimezone(CARACAS_TIMEZONE).date())
+
+    return min(first_dates, default=None)
+
+
+def get_rollup_start_day(end_day):
+    """
+    First day the nightly rollup ending on `end_day` has to cover. That's the
+    lookback window, stretched back to the day after the last rolled up one
+    when the task didn't run for a while, or to the first day with
+    commissions when nothing was rolled up yet.
+    """
+    start_day = end_day - timedelta(days=ROLLUP_LOOKBACK_DAYS - 1)
+    last_rolled_day = CommissionRollup.objects.aggregate(last=Max("day"))["last"]
+    if last_rolled_day is not None:
+        return min(start_day, last_rolled_day + timedelta(days=1))
+
+    first_day = get_first_commission_day()
+    if first_day is None:
+        return start_day
+
+    return min(start_day, first_day)
+
+
+def rollup_commissions(start_day, end_day, now=None):
+    """
+    Replaces the rollups of the days between `start_day` and `end_day`, both
+    included, with freshly calculated ones.
+    """
+    rollups = [
+        CommissionRollup(day=day, store_id=store_id, source=source, amount=amount)
+        for day, store_id, source, amount in calculate_commissions(
+            start_day, end_day, now
+        )
+    ]
+    # Days without commissions get an empty rollup, to mark them as rolled up
+    rolled_days = {rollup.day for rollup in rollups}
+    day = start_day
+    while day <= end_day:
+        if day not in rolled_days:
+            rollups.append(
+                CommissionRollup(day=day, source=CommissionRollup.Source.SETTLED)
+            )
+
+        day += timedelta(days=1)
+
+    with transaction.atomic():
+        CommissionRollup.objects.filter(day__range=(start_day, end_day)).delete()
+        CommissionRollup.objects.bulk_create(rollups, batch_size=1000)
+
+    return rollups
+
+
+def get_pending_ranges(rolled_days, start_day, end_day):
+    """
+    Splits the days between `start_day` and `end_day`, both included, that
+    aren't in the sorted `rolled_days` into (start, end) ranges. A None
+    `start_day` leaves the first range open.
+    """
+    ranges = []
+    pending_start = start_day
+    for rolled_day in rolled_days:
+        if pending_start is None or pending_start < rolled_day:
+            ranges.append((pending_start, rolled_day - timedelta(days=1)))
+
+        pending_start = rolled_day + timedelta(days=1)
+
+    if pending_start is None or pending_start <= end_day:
+        ranges.append((pending_start, end_day))
+
+    return ranges
+
+
+def get_daily_commissions(start_day=None, end_day=None):
+    """
+    Returns the commissions earned each day between `start_day` and `end_day`,
+    both included, as a {day: {source: amount}} dict. A day before today is
+    rolled up once it has at least one rollup row, and is read from them.
+    Every other day is calculated on demand from the purchases.
+    """
+    now = caracas_now()
+    today = now.date()
+    if end_day is None or end_day > today:
+        end_day = today
+
+    rollups = CommissionRollup.objects.filter(day__lt=today, day__lte=end_day)
+    if start_day is not None:
+        rollups = rollups.filter(day__gte=start_day)
+
+    daily_commissions = {}
+    totals = rollups.values("day", "source").annotate(total=Sum("amount"))
+    for total in totals.order_by("day"):
+        day_commissions = daily_commissions.setdefault(total["day"], {})
+        day_commissions[total["source"]] = total["total"]
+
+    rolled_days = sorted(daily_commissions)
+    for pending_start, pending_end in get_pending_ranges(
+        rolled_days, start_day, end_day
+    ):
+        commissions = calculate_commissions(pending_start, pending_end, now)
+        for day, _, source, amount in commissions:
+            day_commissions = daily_commissions.setdefault(day, {})
+            day_commissions[source] = day_commissions.get(source, Decimal(0)) + amount
+
+    return daily_commissions
+
+
+def get_total_commissions(start_day=None, end_day=None):
+    "Total commissions earned between `start_day` and `end_day`, both included"
+    daily_commissions = get_daily_commissions(start_day, end_day)
+    return sum(
+        (sum(sources.values(), Decimal(0)) for sources in daily_commissions.values()),
+        Decimal(0),
+    )
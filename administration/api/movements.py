@@ -0,0 +1,105 @@
+import csv
+import json
+from datetime import date, timedelta
+from enum import Enum
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from administration.api.commissions import day_start
+from payments.serializers import MovementExportSerializer
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class TimeRanges(Enum):
+    PREV_MONTH = "PREV_MONTH"
+    PREV_3_MONTHS = "PREV_3_MONTHS"
+    PREV_YEAR = "PREV_YEAR"
+
+
+def month_start(day, months_ago=0):
+    "First day of the month `months_ago` months before the month of `day`"
+    month_index = day.year * 12 + day.month - 1 - months_ago
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def get_time_range_bounds(time_range, today):
+    """
+    Returns the half-open [start, end) datetimes, in Caracas time, covered by
+    a `TimeRanges` value as seen on `today`:
+
+    - PREV_MONTH: the previous calendar month.
+    - PREV_3_MONTHS: the current calendar month and the two before it.
+    - PREV_YEAR: the current calendar year.
+
+    Returns (None, None) for unknown values.
+    """
+    if time_range == TimeRanges.PREV_MONTH.value:
+        start, end = month_start(today, 1), month_start(today)
+    elif time_range == TimeRanges.PREV_3_MONTHS.value:
+        start, end = month_start(today, 2), month_start(today, -1)
+    elif time_range == TimeRanges.PREV_YEAR.value:
+        start, end = date(today.year, 1, 1), date(today.year + 1, 1, 1)
+    else:
+        return None, None
+
+    return day_start(start), day_start(end)
+
+
+def get_date_range_bounds(start_date=None, end_date=None):
+    """
+    Returns the half-open [start, end) datetimes, in Caracas time, covering
+    every day from `start_date` to `end_date`, both included. Either bound is
+    None when its date is.
+    """
+    start = None if start_date is None else day_start(start_date)
+    end = None if end_date is None else day_start(end_date + timedelta(days=1))
+    return start, end
+
+
+def filter_created_between(queryset, start=None, end=None):
+    "Keeps the rows created in [start, end), comparing the bare column"
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=start)
+
+    if end is not None:
+        queryset = queryset.filter(created_at__lt=end)
+
+    return queryset
+
+
+class Echo:
+    "File-like object that hands back what is written, for streaming CSV rows"
+
+    def write(self, value):
+        return value
+
+
+def iterate_movement_rows(movements, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields the flat representation of every movement, reading them through a
+    server-side cursor. Relations are expected to be selected along with the
+    movements, so each row is built without further queries.
+    """
+    serializer = MovementExportSerializer(context={})
+    for movement in movements.iterator(chunk_size=chunk_size):
+        yield serializer.to_representation(movement)
+
+
+def export_movements_csv(movements):
+    writer = csv.writer(Echo())
+    yield writer.writerow(MovementExportSerializer.Meta.fields)
+    for row in iterate_movement_rows(movements):
+        yield writer.writerow(row.values())
+
+
+def export_movements_ndjson(movements):
+    for row in iterate_movement_rows(movements):
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+# Content type and generator of each export format
+MOVEMENT_EXPORT_FORMATS = {
+    "csv": ("text/csv", export_movements_csv),
+    "ndjson": ("application/x-ndjson", export_movements_ndjson),
+}
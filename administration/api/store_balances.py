@@ -0,0 +1,53 @@
+from django.db.models import OuterRef, Subquery
+
+from administration.models import StoreBalanceSnapshot
+from payments.models import StorePayment, StoreFundAccount
+from stores.api.store_balance import get_store_balances
+from stores.models import Store
+
+SNAPSHOT_FIELDS = ("balance", "last_payment_date", "preferential_account", "updated_at")
+
+
+def refresh_store_balance_snapshots(stores=None):
+    """
+    Recomputes the balance snapshot of every store in `stores`, or of every
+    store, reading them in one query and upserting them in bulk. Returns the
+    snapshots written.
+    """
+    if stores is None:
+        stores = Store.objects.all()
+
+    last_payment = (
+        StorePayment.objects.filter(store=OuterRef("pk"))
+        .order_by("-created_at")
+        .values("created_at")[:1]
+    )
+    preferential_account = (
+        StoreFundAccount.objects.filter(store=OuterRef("pk"), is_preferential=True)
+        .order_by("created_at")
+        .values("pk")[:1]
+    )
+    balances = (
+        get_store_balances(stores)
+        .annotate(
+            last_payment_date=Subquery(last_payment),
+            preferential_account_id=Subquery(preferential_account),
+        )
+        .values_list("pk", "balance", "last_payment_date", "preferential_account_id")
+    )
+    snapshots = [
+        StoreBalanceSnapshot(
+            store_id=store_id,
+            balance=balance,
+            last_payment_date=last_payment_date,
+            preferential_account_id=preferential_account_id,
+        )
+        for store_id, balance, last_payment_date, preferential_account_id in balances
+    ]
+    return StoreBalanceSnapshot.objects.bulk_create(
+        snapshots,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["store"],
+        update_fields=SNAPSHOT_FIELDS,
+    )
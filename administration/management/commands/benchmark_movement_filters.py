@@ -0,0 +1,157 @@
+from datetime import timedelta
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from administration.api.movements import (
+    TimeRanges,
+    filter_created_between,
+    get_date_range_bounds,
+    get_time_range_bounds,
+)
+from payments.models import Movement
+from stores.api.schedules import caracas_now
+
+PAGE_SIZE = 15
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the latency of the admin movements date filters written over "
+        "month/date functions and as half-open created_at ranges, over synthetic "
+        "movements. Meant for PostgreSQL, SQLite works for rough comparisons. "
+        "Nothing is persisted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=1_000_000)
+        parser.add_argument("--years", type=int, default=3)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--explain", action="store_true", help="Print the query plans as well"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.create_synthetic_movements(options["size"], options["years"])
+                self.report(options["repeat"], options["explain"])
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def create_synthetic_movements(self, size, years):
+        self.stdout.write(f"Creating {size} synthetic movements...")
+        movement_types = [movement_type.value for movement_type in Movement.Type]
+        table = Movement._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    f"""
+                    INSERT INTO {table} (
+                        movement_type, grouping_id, created_at, updated_at,
+                        actor_username, store_name
+                    )
+                    SELECT
+                        (%s::varchar[])[1 + (i %% %s)],
+                        i,
+                        now() - random() * %s * interval '365 days',
+                        now(),
+                        '',
+                        ''
+                    FROM generate_series(1, %s) AS i
+                    """,
+                    [movement_types, len(movement_types), years, size],
+                )
+            else:
+                # SQLite stores datetimes as UTC text in Django's format
+                type_cases = " ".join(
+                    f"WHEN {i} THEN %s" for i in range(len(movement_types))
+                )
+                cursor.execute(
+                    f"""
+                    WITH RECURSIVE series(i) AS (
+                        SELECT 1 UNION ALL SELECT i + 1 FROM series WHERE i < %s
+                    )
+                    INSERT INTO {table} (
+                        movement_type, grouping_id, created_at, updated_at,
+                        actor_username, store_name
+                    )
+                    SELECT
+                        CASE i %% {len(movement_types)} {type_cases} END,
+                        i,
+                        strftime(
+                            '%%Y-%%m-%%d %%H:%%M:%%f',
+                            'now',
+                            '-' || (abs(random()) %% %s) || ' seconds'
+                        ),
+                        strftime('%%Y-%%m-%%d %%H:%%M:%%f', 'now'),
+                        '',
+                        ''
+                    FROM series
+                    """,
+                    [size, *movement_types, years * 365 * 24 * 60 * 60],
+                )
+
+            cursor.execute(f"ANALYZE {table}")
+
+    def get_filters(self):
+        today = caracas_now().date()
+        start_date, end_date = today - timedelta(days=30), today
+        movements = Movement.objects.order_by("-created_at")
+        filters = {}
+        for time_range in TimeRanges:
+            start, end = get_time_range_bounds(time_range.value, today)
+            filters[time_range.value] = (
+                self.get_legacy_time_range(movements, time_range, today),
+                filter_created_between(movements, start, end),
+            )
+
+        start, end = get_date_range_bounds(start_date, end_date)
+        filters["DATE_RANGE"] = (
+            movements.filter(created_at__date__range=(start_date, end_date)),
+            filter_created_between(movements, start, end),
+        )
+        typed = movements.filter(movement_type=Movement.Type.FUNDING)
+        filters["FUNDING_DATE_RANGE"] = (
+            typed.filter(created_at__date__range=(start_date, end_date)),
+            filter_created_between(typed, start, end),
+        )
+        return filters
+
+    @staticmethod
+    def get_legacy_time_range(movements, time_range, today):
+        "The filters the admin movements list used before the ranges"
+        month = today.month
+        if time_range == TimeRanges.PREV_MONTH:
+            return movements.filter(created_at__month=month - 1)
+        elif time_range == TimeRanges.PREV_3_MONTHS:
+            return movements.filter(created_at__month__in=[month, month - 1, month - 2])
+
+        return movements.filter(created_at__year=today.year)
+
+    def time(self, queryset, repeat):
+        "Average milliseconds to count the matches and fetch the first page"
+        start = perf_counter()
+        for _ in range(repeat):
+            queryset.count()
+            list(queryset[:PAGE_SIZE])
+
+        return (perf_counter() - start) / repeat * 1000
+
+    def report(self, repeat, explain):
+        for name, (legacy, ranged) in self.get_filters().items():
+            legacy_time = self.time(legacy, repeat)
+            ranged_time = self.time(ranged, repeat)
+            self.stdout.write(
+                f"{name}: {legacy.count()} vs {ranged.count()} rows, "
+                f"functions {legacy_time:.2f} ms, ranges {ranged_time:.2f} ms"
+            )
+            if explain:
+                self.stdout.write(legacy[:PAGE_SIZE].explain(analyze=True))
+                self.stdout.write(ranged[:PAGE_SIZE].explain(analyze=True))
@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from administration.api.commissions import get_first_commission_day, rollup_commissions
+from stores.api.schedules import caracas_now
+
+
+class Command(BaseCommand):
+    help = (
+        "Rolls up the daily commissions between two days, both included. Run it "
+        "once without arguments to backfill the whole history."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start-day",
+            type=date.fromisoformat,
+            help="Defaults to the first day with commissions",
+        )
+        parser.add_argument(
+            "--end-day", type=date.fromisoformat, help="Defaults to yesterday"
+        )
+
+    def handle(self, *args, **options):
+        end_day = options["end_day"] or caracas_now().date() - timedelta(days=1)
+        start_day = options["start_day"]
+        if start_day is None:
+            start_day = get_first_commission_day()
+            if start_day is None:
+                self.stdout.write("There are no commissions to roll up")
+                return
+
+        if start_day > end_day:
+            raise CommandError("The start day must not be after the end day")
+
+        rollups = rollup_commissions(start_day, end_day)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rolled up {len(rollups)} commissions from {start_day} to {end_day}"
+            )
+        )
@@ -0,0 +1,72 @@
+# Generated by Django 4.1.4 on 2026-10-16 15:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stores", "0006_purchase_status_indexes"),
+        ("administration", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CommissionRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "day",
+                    models.DateField(
+                        help_text="Day, in Caracas time, the commissions belong to"
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[
+                            ("SETTLED", "Purchases paid to the store"),
+                            ("REFUNDED", "Rejected purchases refunded to the customer"),
+                            ("EXPIRED", "Gifts expired without being claimed"),
+                        ],
+                        max_length=8,
+                    ),
+                ),
+                (
+                    "amount",
+                    models.DecimalField(
+                        decimal_places=6,
+                        default=0,
+                        help_text="Sum of the commissions of the purchases",
+                        max_digits=25,
+                    ),
+                ),
+                (
+                    "store",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="stores.store",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["created_at"],
+                "abstract": False,
+                "indexes": [
+                    models.Index(fields=["day"], name="commission_rollup_day_idx")
+                ],
+            },
+        ),
+    ]
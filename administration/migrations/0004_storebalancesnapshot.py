@@ -0,0 +1,112 @@
+# Generated by Django 4.1.4 on 2026-10-16 18:00
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+import django.db.models.deletion
+
+
+def populate_snapshots(apps, schema_editor):
+    Store = apps.get_model("stores", "Store")
+    StorePayment = apps.get_model("payments", "StorePayment")
+    StoreFundAccount = apps.get_model("payments", "StoreFundAccount")
+    StoreBalanceSnapshot = apps.get_model("administration", "StoreBalanceSnapshot")
+
+    last_payment = (
+        StorePayment.objects.filter(store=OuterRef("pk"))
+        .order_by("-created_at")
+        .values("created_at")[:1]
+    )
+    preferential_account = (
+        StoreFundAccount.objects.filter(store=OuterRef("pk"), is_preferential=True)
+        .order_by("created_at")
+        .values("pk")[:1]
+    )
+    stores = Store.objects.annotate(
+        balance=F("unpaid_amount") * (1 - F("commission_percentage")),
+        last_payment_date=Subquery(last_payment),
+        preferential_account_id=Subquery(preferential_account),
+    ).values_list("pk", "balance", "last_payment_date", "preferential_account_id")
+    StoreBalanceSnapshot.objects.bulk_create(
+        [
+            StoreBalanceSnapshot(
+                store_id=store_id,
+                balance=balance,
+                last_payment_date=last_payment_date,
+                preferential_account_id=preferential_account_id,
+            )
+            for store_id, balance, last_payment_date, preferential_account_id in stores
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stores", "0006_purchase_status_indexes"),
+        ("payments", "0006_movement_search_fields"),
+        ("administration", "0003_commissionrollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoreBalanceSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "balance",
+                    models.DecimalField(
+                        decimal_places=6,
+                        default=0,
+                        help_text="What Beers owes the store, commission already discounted",
+                        max_digits=25,
+                    ),
+                ),
+                (
+                    "last_payment_date",
+                    models.DateTimeField(
+                        help_text="When the store was last paid", null=True
+                    ),
+                ),
+                (
+                    "preferential_account",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="payments.storefundaccount",
+                    ),
+                ),
+                (
+                    "store",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balance_snapshot",
+                        to="stores.store",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["created_at"],
+                "abstract": False,
+                "indexes": [
+                    models.Index(fields=["balance"], name="store_balance_balance_idx"),
+                    models.Index(
+                        fields=["last_payment_date"],
+                        name="store_balance_last_payment_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(populate_snapshots, migrations.RunPython.noop),
+    ]
@@ -107,3 +107,56 @@ class FundOperation(TimeStampedModel):
                 return self.amount
 
         return round_to_fixed_exponent((self.amount / self.usd_exchange_rate))
+
+
+class CommissionRollup(TimeStampedModel):
+    """Commissions earned by Beers in a day from a store's purchases"""
+
+    class Source(models.TextChoices):
+        SETTLED = "SETTLED", "Purchases paid to the store"
+        REFUNDED = "REFUNDED", "Rejected purchases refunded to the customer"
+        EXPIRED = "EXPIRED", "Gifts expired without being claimed"
+
+    day = models.DateField(help_text="Day, in Caracas time, the commissions belong to")
+    store = models.ForeignKey("stores.Store", on_delete=models.SET_NULL, null=True)
+    source = models.CharField(max_length=8, choices=Source.choices)
+    amount = models.DecimalField(
+        max_digits=25,
+        decimal_places=6,
+        default=0,
+        help_text="Sum of the commissions of the purchases",
+    )
+
+    class Meta(TimeStampedModel.Meta):
+        indexes = [models.Index(fields=["day"], name="commission_rollup_day_idx")]
+
+
+class StoreBalanceSnapshot(TimeStampedModel):
+    """Precomputed balance of a store, as listed to the admins"""
+
+    store = models.OneToOneField(
+        "stores.Store", related_name="balance_snapshot", on_delete=models.CASCADE
+    )
+    balance = models.DecimalField(
+        max_digits=25,
+        decimal_places=6,
+        default=0,
+        help_text="What Beers owes the store, commission already discounted",
+    )
+    last_payment_date = models.DateTimeField(
+        null=True, help_text="When the store was last paid"
+    )
+    preferential_account = models.ForeignKey(
+        "payments.StoreFundAccount",
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="+",
+    )
+
+    class Meta(TimeStampedModel.Meta):
+        indexes = [
+            models.Index(fields=["balance"], name="store_balance_balance_idx"),
+            models.Index(
+                fields=["last_payment_date"], name="store_balance_last_payment_idx"
+            ),
+        ]
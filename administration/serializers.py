@@ -1,17 +1,18 @@
 from decimal import Decimal
 
 from django.db import transaction
-from django.db.models import Prefetch
 
 from rest_framework import serializers
 
-from administration.models import FundAccount, FundOperation
+from administration.models import FundAccount, FundOperation, StoreBalanceSnapshot
 
-from stores.models import Product, Store, Purchase, PurchaseHasProduct
+from stores.models import Store, Purchase
+from stores.api.purchase_lines import get_product_lines
+from stores.serializers import PurchaseLinesListSerializer
 
 from payments.models import Movement, StorePayment
+from payments.api.movements import MovementWriter
 from payments.serializers import (
-    MovementSerializer,
     StorePaymentSerializer,
     StoreFundAccountSerializer,
 )
@@ -40,18 +41,9 @@ class FundOperationSerializerHelper:
             Movement.Type.FUNDS_EXCHANGE_ORIGIN.value,
             Movement.Type.FUNDS_EXCHANGE_DESTINATION.value,
         ]
-        grouping_id = Movement.objects.get_next_grouping_id()
-        movements_data = [
-            {
-                "movement_type": mov_type,
-                "admin_operation": self.operation.id,
-                "grouping_id": grouping_id,
-            }
-            for mov_type in exchange_types
-        ]
-        movement_serializer = MovementSerializer(data=movements_data, many=True)
-        movement_serializer.is_valid(raise_exception=True)
-        movement_serializer.save()
+        movement_writer = MovementWriter()
+        movement_writer.add_group(exchange_types, admin_operation=self.operation)
+        movement_writer.save()
 
     def create_related_movements(self):
         if self.is_exchange_op:
@@ -61,14 +53,9 @@ class FundOperationSerializerHelper:
         withdrawal_type = Movement.Type.ADMIN_FUNDS_WITHDRAWAL.value
         is_deposit = self.operation.amount > 0
         movement_type = deposit_type if is_deposit else withdrawal_type
-        movement_data = {
-            "movement_type": movement_type,
-            "admin_operation": self.operation.id,
-            "grouping_id": Movement.objects.get_next_grouping_id(),
-        }
-        movement_serializer = MovementSerializer(data=movement_data)
-        movement_serializer.is_valid(raise_exception=True)
-        movement_serializer.save()
+        movement_writer = MovementWriter()
+        movement_writer.add_group([movement_type], admin_operation=self.operation)
+        movement_writer.save()
 
     def modify_accounts_balances(self):
         if self.is_exchange_op:
@@ -201,13 +188,18 @@ class AdminStoreSerializer(serializers.ModelSerializer):
 
 
 class AdminStoreBalanceSerializer(serializers.ModelSerializer):
-    last_payment_date = serializers.SerializerMethodField()
+    id = serializers.IntegerField(source="store_id")
+    name = serializers.CharField(source="store.name")
+    contact_name = serializers.CharField(source="store.contact_name")
+    phone = serializers.CharField(source="store.phone")
     preferential_account = serializers.SerializerMethodField()
-    balance = serializers.SerializerMethodField()
+    balance = serializers.DecimalField(
+        max_digits=25, decimal_places=6, coerce_to_string=False, read_only=True
+    )
     balance_local_currency = serializers.SerializerMethodField()
 
     class Meta:
-        model = Store
+        model = StoreBalanceSnapshot
         fields = [
             "id",
             "name",
@@ -219,25 +211,16 @@ class AdminStoreBalanceSerializer(serializers.ModelSerializer):
             "balance_local_currency",
         ]
 
-    def get_last_payment_date(self, obj):
-        if not obj.last_payment_date:
-            return
-
-        return obj.last_payment_date
-
     def get_preferential_account(self, obj):
-        if len(obj.preferential_account) == 0:
+        if obj.preferential_account is None:
             return
 
         serializer = StoreFundAccountSerializer(
-            obj.preferential_account[0],
+            obj.preferential_account,
             fields=["bank_name", "number", "doc_type", "doc_number"],
         )
         return serializer.data
 
-    def get_balance(self, obj):
-        return obj.balance
-
     def get_balance_local_currency(self, obj):
         usd_exchange = self.context["usd_ves_rate"]
         return round_to_fixed_exponent(obj.balance * Decimal(usd_exchange))
@@ -262,18 +245,6 @@ class AdminStorePaymentSerializer(StorePaymentSerializer):
         read_only_fields = ["amount_local_currency", "reference_number"]
 
 
-class AdminPurchaseProductSerializer(serializers.ModelSerializer):
-    quantity = serializers.SerializerMethodField()
-
-    class Meta:
-        model = Product
-        fields = ["id", "name", "quantity"]
-        read_only_fields = ["id", "name", "quantity"]
-
-    def get_quantity(self, obj):
-        return obj.detail[0].quantity
-
-
 class UnclaimedPurchaseSerialiser(serializers.ModelSerializer):
     products = serializers.SerializerMethodField()
 
@@ -289,18 +260,17 @@ class UnclaimedPurchaseSerialiser(serializers.ModelSerializer):
             "store",
             "products",
         ]
+        list_serializer_class = PurchaseLinesListSerializer
 
     def get_products(self, obj):
-        purchase_has_product = PurchaseHasProduct.objects.filter(purchase=obj.id)
-        products = obj.products.prefetch_related(
-            Prefetch(
-                "purchasehasproduct_set",
-                queryset=purchase_has_product,
-                to_attr="detail",
-            ),
-        )
-        serializer = AdminPurchaseProductSerializer(products, many=True)
-        return serializer.data
+        return [
+            {
+                "id": line.product_id,
+                "name": line.product.name,
+                "quantity": line.quantity,
+            }
+            for line in get_product_lines(obj)
+        ]
 
 
 class SystemCurrencySerializer(serializers.ModelSerializer):
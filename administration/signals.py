@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from administration.api.store_balances import refresh_store_balance_snapshots
+from payments.models import StorePayment, StoreFundAccount
+from stores.models import Store, store_balances_changed
+
+
+def refresh_changed_store_balances(sender, store_ids, **kwargs):
+    refresh_store_balance_snapshots(Store.objects.filter(pk__in=store_ids))
+
+
+def refresh_store_balance(sender, instance, **kwargs):
+    store_id = instance.pk if sender is Store else instance.store_id
+    refresh_store_balance_snapshots(Store.objects.filter(pk=store_id))
+
+
+def refresh_store_balance_on_commit(sender, instance, **kwargs):
+    # Deleting a store deletes its payments and accounts too, wait until the
+    # store is gone so its snapshot isn't written back
+    transaction.on_commit(
+        lambda: refresh_store_balance_snapshots(
+            Store.objects.filter(pk=instance.store_id)
+        )
+    )
+
+
+store_balances_changed.connect(
+    refresh_changed_store_balances,
+    sender=Store,
+    dispatch_uid="store_balance_snapshot_balances_changed",
+)
+
+for model in (Store, StorePayment, StoreFundAccount):
+    post_save.connect(
+        refresh_store_balance,
+        sender=model,
+        dispatch_uid=f"store_balance_snapshot_post_save_{model.__name__}",
+    )
+
+for model in (StorePayment, StoreFundAccount):
+    post_delete.connect(
+        refresh_store_balance_on_commit,
+        sender=model,
+        dispatch_uid=f"store_balance_snapshot_post_delete_{model.__name__}",
+    )
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from beers.celery import app
+
+from administration.api.commissions import get_rollup_start_day, rollup_commissions
+from administration.api.store_balances import refresh_store_balance_snapshots
+from stores.api.schedules import caracas_now
+
+
+@app.task(bind=True)
+def rollup_daily_commissions(self):
+    """
+    Rolls up the commissions of the last few days, ending yesterday, along
+    with any older day that wasn't rolled up yet
+    """
+    yesterday = caracas_now().date() - timedelta(days=1)
+    rollups = rollup_commissions(get_rollup_start_day(yesterday), yesterday)
+    return len(rollups)
+
+
+@app.task(bind=True)
+def refresh_store_balances(self):
+    "Recomputes the balance snapshot of every store"
+    snapshots = refresh_store_balance_snapshots()
+    return len(snapshots)
@@ -17,7 +17,14 @@ router.register(r"stores", views.StoresViewSet, basename="admin-stores")
 router.register(r"stores-fund-accounts", views.StoreAccountsViewSet)
 
 urlpatterns = [
-    path("commissions/", views.CommissionsTotalView.as_view()),
+    path(
+        "commissions/", views.CommissionsTotalView.as_view(), name="admin-commissions"
+    ),
+    path(
+        "commissions/daily/",
+        views.CommissionsDailyView.as_view(),
+        name="admin-commissions-daily",
+    ),
     path(
         "customer-fundings/force/<int:funding_id>/",
         views.ForceFailedCustomerFunding.as_view(),
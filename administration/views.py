@@ -1,18 +1,35 @@
-from datetime import date, datetime, timezone
-from enum import Enum
+from datetime import date
 from decimal import Decimal
 
-from django.db.models import Sum, Prefetch, OuterRef, Subquery, Max, Q, F
+from django.db.models import Sum, Q
 from django.db import transaction
+from django.http import StreamingHttpResponse
 
 from rest_framework import viewsets, status, mixins
-from rest_framework.generics import ListAPIView
+from rest_framework.decorators import action
+from rest_framework.generics import ListAPIView, get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.parsers import MultiPartParser
+from rest_framework.exceptions import ValidationError
 
-from administration.models import FundAccount, FundOperation
+from administration.models import (
+    FundAccount,
+    FundOperation,
+    CommissionRollup,
+    StoreBalanceSnapshot,
+)
+from administration.api.commissions import (
+    get_daily_commissions,
+    get_total_commissions,
+)
+from administration.api.movements import (
+    MOVEMENT_EXPORT_FORMATS,
+    get_time_range_bounds,
+    get_date_range_bounds,
+    filter_created_between,
+)
 from administration.serializers import (
     FundAccountSerializer,
     FundOperationSerializer,
@@ -23,10 +40,11 @@ from administration.serializers import (
 )
 
 from stores.api.store_balance import (
-    calculate_store_balance,
+    get_store_balances,
     get_stores_and_unpaid_purchases,
 )
-from stores.models import Purchase, Store, Product
+from stores.models import Store, Product
+from stores.api.schedules import caracas_now
 from stores.serializers import ProductSerializer
 
 from payments.models import Movement, Funding, StorePayment, StoreFundAccount
@@ -37,6 +55,8 @@ from payments.serializers import (
     StoreFundAccountSerializer,
 )
 from payments.api.fulfill_orders import add_funds_to_admin_account, send_receipt_email
+from payments.api.payout_totals import get_payout_totals
+from payments.api.movements import select_movement_relations
 
 from users.models import SystemCurrency
 from users.serializers import add_funds_to_customer
@@ -44,15 +64,10 @@ from users.serializers import add_funds_to_customer
 from administration.serializers import AdminStorePaymentSerializer
 
 from common.money_exchange.dolar_venezuela import usd_exchange_rate_service
+from common.pagination import OptionalKeysetPagination
 from common.utils import round_to_fixed_exponent
 
 
-class TimeRanges(Enum):
-    PREV_MONTH = "PREV_MONTH"
-    PREV_3_MONTHS = "PREV_3_MONTHS"
-    PREV_YEAR = "PREV_YEAR"
-
-
 # Create your views here.
 class FundAccountViewSet(viewsets.ModelViewSet):
     queryset = FundAccount.objects.all()
@@ -72,6 +87,7 @@ class FundOperationViewSet(viewsets.ModelViewSet):
 class MovementsView(viewsets.ReadOnlyModelViewSet):
     serializer_class = ReadOnlyMovementSerializer
     permission_classes = (IsAdminUser,)
+    pagination_class = OptionalKeysetPagination
 
     def get_queryset(self):
         queryset = Movement.objects.order_by("-created_at").exclude(
@@ -79,70 +95,80 @@ class MovementsView(viewsets.ReadOnlyModelViewSet):
         )
 
         query_params = self.request.query_params
+        today = caracas_now().date()
         time_range = query_params.get("time_range")
-        if time_range == TimeRanges.PREV_MONTH.value:
-            queryset = queryset.filter(created_at__month=date.today().month - 1)
-        elif time_range == TimeRanges.PREV_3_MONTHS.value:
-            curr_month = date.today().month
-            last_3_months = [curr_month, curr_month - 1, curr_month - 2]
-            queryset = queryset.filter(created_at__month__in=last_3_months)
-        elif time_range == TimeRanges.PREV_YEAR.value:
-            queryset = queryset.filter(created_at__year=date.today().year)
-
-        start_date = query_params.get("start_date")
-        end_date = query_params.get("end_date")
-        if start_date is not None and end_date is not None:
-            queryset = queryset.filter(created_at__date__range=(start_date, end_date))
-        elif start_date is not None:
-            queryset = queryset.filter(created_at__date__gte=start_date)
-        elif end_date is not None:
-            queryset = queryset.filter(created_at__date__lte=end_date)
+        start, end = get_time_range_bounds(time_range, today)
+        queryset = filter_created_between(queryset, start, end)
+
+        try:
+            start_date, end_date = get_date_range(query_params)
+        except ValueError:
+            raise ValidationError({"message": "Dates must be formatted as YYYY-MM-DD"})
+
+        start, end = get_date_range_bounds(start_date, end_date)
+        queryset = filter_created_between(queryset, start, end)
 
         movement_type = query_params.get("movement_type", None)
         if movement_type is not None:
             queryset = queryset.filter(movement_type=movement_type)
 
+        # Prefix search on the names copied to each movement, so "nat" finds
+        # "natural_person" but "person" doesn't
         username = query_params.get("username")
         if username is not None:
-            user_username = Q(purchase__user__username__icontains=username) | Q(
-                funding__user__username__icontains=username
+            username = username.lower()
+            queryset = queryset.filter(
+                Q(actor_username__startswith=username)
+                | Q(store_name__startswith=username)
             )
-            admin_username = Q(admin_operation__admin__username__icontains=username)
-            store_username = Q(store_payment__store__user__username__icontains=username)
-            username_filter = user_username | admin_username | store_username
-            queryset = queryset.filter(username_filter)
 
-        return queryset
+        return select_movement_relations(queryset)
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        "Streams every movement matching the list filters as CSV or NDJSON"
+        export_format = request.query_params.get("export_format", "csv")
+        if export_format not in MOVEMENT_EXPORT_FORMATS:
+            formats = ", ".join(MOVEMENT_EXPORT_FORMATS)
+            return Response(
+                {"message": f"export_format must be one of: {formats}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        content_type, export_movements = MOVEMENT_EXPORT_FORMATS[export_format]
+        # The exported columns only read selected relations, not prefetched ones
+        movements = self.get_queryset().prefetch_related(None)
+        response = StreamingHttpResponse(
+            export_movements(movements), content_type=content_type
+        )
+        filename = f"movements.{export_format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+def get_date_range(query_params, start_param="start_date", end_param="end_date"):
+    "Reads the optional start and end date query parameters"
+    dates = []
+    for param in (start_param, end_param):
+        value = query_params.get(param, None)
+        dates.append(None if value is None else date.fromisoformat(value))
+
+    return dates
 
 
 class CommissionsTotalView(APIView):
     permission_classes = (IsAdminUser,)
 
     def get(self, request):
-        store_payments_commissions = (
-            StorePayment.objects.annotate(
-                purchases_commissions=Sum(
-                    F("purchases__amount") * F("purchases__commission_percentage")
-                )
-            ).aggregate(total=Sum("purchases_commissions"))
-        )["total"]
-        if not store_payments_commissions:
-            store_payments_commissions = Decimal(0)
-
-        rejected = Q(status=Purchase.Status.REJECTED)
-        pending = Q(status=Purchase.Status.PENDING)
-        current_datetime = datetime.now(tz=timezone.utc)
-        expired = pending & Q(gift_expiration_date__lte=current_datetime)
-        applicable_purchases = Purchase.objects.filter(rejected | expired)
-        purchases_commissions = (
-            applicable_purchases.annotate(
-                commission_amount=F("amount") * F("commission_percentage")
-            ).aggregate(total=Sum("commission_amount"))
-        )["total"]
-        if not purchases_commissions:
-            purchases_commissions = Decimal(0)
-
-        total = store_payments_commissions + purchases_commissions
+        try:
+            start_date, end_date = get_date_range(request.query_params)
+        except ValueError:
+            return Response(
+                {"message": "Dates must be formatted as YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        total = get_total_commissions(start_date, end_date)
         usd_exchange_rate = usd_exchange_rate_service.get_usd_exchange_rate()
         total_local_currency = total * usd_exchange_rate
         return Response(
@@ -154,6 +180,31 @@ class CommissionsTotalView(APIView):
         )
 
 
+class CommissionsDailyView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        try:
+            start_date, end_date = get_date_range(request.query_params)
+        except ValueError:
+            return Response(
+                {"message": "Dates must be formatted as YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        daily_commissions = get_daily_commissions(start_date, end_date)
+        results = []
+        for day, sources in sorted(daily_commissions.items()):
+            day_commissions = {
+                source.lower(): sources.get(source, Decimal(0))
+                for source in CommissionRollup.Source.values
+            }
+            day_commissions["total"] = sum(day_commissions.values(), Decimal(0))
+            results.append({"day": day, **day_commissions})
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
 class ForceFailedCustomerFunding(APIView):
     permission_classes = (IsAdminUser,)
 
@@ -220,36 +271,31 @@ class StoresViewSet(
 
 
 class StoresBalanceView(ListAPIView):
-    queryset = Store.objects.all()
+    queryset = StoreBalanceSnapshot.objects.exclude(balance=0)
     permission_classes = (IsAuthenticated, IsAdminUser)
     serializer_class = AdminStoreBalanceSerializer
 
     def get_queryset(self):
-        queryset = self.queryset
+        queryset = self.queryset.select_related("store", "preferential_account")
         query_params = self.request.query_params
 
         store_name = query_params.get("store_name")
         if store_name is not None:
-            queryset = queryset.filter(name__icontains=store_name)
-
-        payments = (
-            StorePayment.objects.filter(store=OuterRef("pk")).order_by().values("store")
-        )
-        last_payment = payments.annotate(last_payment=Max("created_at")).values(
-            "last_payment"
-        )
-        queryset = queryset.annotate(last_payment_date=Subquery(last_payment))
+            queryset = queryset.filter(store__name__icontains=store_name)
 
-        start_date = query_params.get("last_payment_start_date")
-        end_date = query_params.get("last_payment_end_date")
-        if start_date is not None and end_date is not None:
-            queryset = queryset.filter(
-                last_payment_date__date__range=(start_date, end_date)
+        try:
+            start_date, end_date = get_date_range(
+                query_params, "last_payment_start_date", "last_payment_end_date"
             )
-        elif start_date is not None:
-            queryset = queryset.filter(last_payment_date__date__gte=start_date)
-        elif end_date is not None:
-            queryset = queryset.filter(last_payment_date__date__lte=end_date)
+        except ValueError:
+            raise ValidationError({"message": "Dates must be formatted as YYYY-MM-DD"})
+
+        start, end = get_date_range_bounds(start_date, end_date)
+        if start is not None:
+            queryset = queryset.filter(last_payment_date__gte=start)
+
+        if end is not None:
+            queryset = queryset.filter(last_payment_date__lt=end)
 
         return queryset
 
@@ -261,21 +307,11 @@ class StoresBalanceView(ListAPIView):
         else:
             store_id = user.store.id
 
-        balance_by_store = calculate_store_balance(
-            store_id, self.get_queryset()
-        ).exclude(balance=0)
-
-        preferential_acc = StoreFundAccount.objects.filter(is_preferential=True)
-        payments_qs = StorePayment.objects.order_by("-created_at")
-        balance_by_store = balance_by_store.prefetch_related(
-            Prefetch(
-                "fund_accounts",
-                queryset=preferential_acc,
-                to_attr="preferential_account",
-            ),
-            Prefetch("payments", queryset=payments_qs),
-        ).order_by("-balance")
+        balance_by_store = self.get_queryset()
+        if store_id is not None:
+            balance_by_store = balance_by_store.filter(store=store_id)
 
+        balance_by_store = balance_by_store.order_by("-balance", "store")
         unpaid_balance = balance_by_store.aggregate(Sum("balance"))["balance__sum"]
 
         usd_exchange = usd_exchange_rate_service.get_usd_exchange_rate()
@@ -327,31 +363,34 @@ class StorePaymentViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         response = super().list(request, *args, **kwargs)
         data_copy = response.data.copy()
-        payments = data_copy["results"]
 
         usd_exchange_rate = usd_exchange_rate_service.get_usd_exchange_rate()
-        balance_by_store = calculate_store_balance(None)
-        store_id = request.query_params.get("store_id", None)
-        if store_id is not None:
-            total_unpaid = balance_by_store.get(store=store_id).balance
-        else:
-            total_unpaid = sum([store.balance for store in balance_by_store])
-
+        query_params = request.query_params
+        totals = get_payout_totals(
+            self.get_queryset(),
+            store_id=query_params.get("store_id", None),
+            start_date=query_params.get("start_date", None),
+            end_date=query_params.get("end_date", None),
+        )
+        total_unpaid = totals["total_unpaid"]
         total_unpaid_bs = total_unpaid * Decimal(str(usd_exchange_rate))
-        total_paid = sum([Decimal(p["amount"]) for p in payments])
-        total_paid_bs = sum([p["amount_local_currency"] for p in payments])
 
         data_copy["total_unpaid"] = total_unpaid
         data_copy["total_unpaid_local_currency"] = total_unpaid_bs
-        data_copy["total_paid"] = total_paid
-        data_copy["total_paid_local_currency"] = total_paid_bs
+        data_copy["total_paid"] = totals["total_paid"]
+        data_copy["total_paid_local_currency"] = totals["total_paid_local_currency"]
         return Response(data_copy, status=response.status_code)
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["store_balance"] = getattr(self, "store_balance", None)
+        return context
+
     def create(self, request, *args, **kwargs):
-        store = request.data["store"]
-        balances_by_store = calculate_store_balance(store)
-        store_balance = balances_by_store.get(store=store)
-        amount_owed = round_to_fixed_exponent(store_balance.balance)
+        self.store_balance = get_object_or_404(
+            get_store_balances(), pk=request.data["store"]
+        )
+        amount_owed = round_to_fixed_exponent(self.store_balance.balance)
 
         data = {
             "store": request.data["store"],
@@ -106,6 +106,17 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("CACHE_URL", "redis://localhost:6379/1"),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -210,4 +221,14 @@ CELERY_BEAT_SCHEDULE = {
         "task": "stores.tasks.expire_purchases",
         "schedule": crontab(hour=0, minute=0),
     },
+    "rollup_daily_commissions": {
+        "task": "administration.tasks.rollup_daily_commissions",
+        # After expire_purchases, so the expired gifts are already rejected
+        "schedule": crontab(hour=0, minute=30),
+    },
+    "refresh_store_balances": {
+        "task": "administration.tasks.refresh_store_balances",
+        # Writes keep the snapshots current, this catches up on any missed one
+        "schedule": crontab(minute="*/15"),
+    },
 }
@@ -0,0 +1,105 @@
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from rest_framework import serializers
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pages through rows newest first, keyed on (created_at, id). Every page
+    starts right after the last row of the previous one, so deep pages cost
+    as much as the first one, and no total count is run.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = "after"
+    ordering = ("-created_at", "-pk")
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor, queryset.model)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+            )
+
+        # One extra row tells whether there's a next page
+        rows = list(queryset[: self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        return self.page
+
+    def encode_cursor(self, row):
+        position = f"{row.created_at.isoformat()}|{row.pk}"
+        return urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor, model):
+        try:
+            position = urlsafe_b64decode(cursor.encode()).decode()
+            created_at, pk = position.split("|", 1)
+            created_at = parse_datetime(created_at)
+            pk = model._meta.pk.to_python(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError, ValidationError):
+            created_at = None
+
+        if created_at is None:
+            raise serializers.ValidationError(
+                {self.cursor_query_param: self.invalid_cursor_message}
+            )
+
+        return created_at, pk
+
+    def get_next_link(self):
+        if not self.has_next:
+            return
+
+        url = self.request.build_absolute_uri()
+        cursor = self.encode_cursor(self.page[-1])
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+
+class OptionalKeysetPagination(PageNumberPagination):
+    """
+    Page number pagination, as everywhere else, unless the client opts into
+    keyset pagination with `?pagination=cursor`. The `next` links of keyset
+    pages carry the `after` cursor, which keeps following pages in keyset
+    mode.
+    """
+
+    keyset_class = KeysetPagination
+    keyset = None
+
+    def use_keyset(self, request):
+        query_params = request.query_params
+        return (
+            query_params.get("pagination") == "cursor"
+            or self.keyset_class.cursor_query_param in query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
@@ -1,3 +1,7 @@
+import json
+import heapq
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+
 from django.core.paginator import Paginator
 
 from rest_framework import serializers
@@ -63,3 +67,76 @@ def paginate_objects(objects, page_num, per_page):
         "results": page.object_list,
     }
     return response
+
+
+def encode_cursor(key):
+    "Encodes a ranking key into an opaque `after` cursor"
+    return urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+
+def get_key_types(key):
+    "Types of the values of a ranking key, any number counts as a float"
+    return [
+        bool
+        if isinstance(value, bool)
+        else float
+        if isinstance(value, (int, float))
+        else type(value)
+        for value in key
+    ]
+
+
+def decode_cursor(cursor, template=None):
+    """
+    Decodes an `after` cursor back into a ranking key. When a `template` key
+    is given, the cursor must hold as many values as it and of the same types.
+    """
+    try:
+        key = json.loads(urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        key = None
+
+    is_valid = isinstance(key, list)
+    if is_valid and template is not None:
+        is_valid = get_key_types(key) == get_key_types(template)
+
+    if not is_valid:
+        raise serializers.ValidationError({"after": "Invalid cursor"})
+
+    return tuple(key)
+
+
+def paginate_top_k(objects, key, page_num, per_page, serialize=None, after=None):
+    """
+    Paginates `objects` ranked by `key` without sorting the whole list, only
+    the first `page_num * per_page` objects are kept in a bounded heap and only
+    the requested page is passed to `serialize`.
+
+    `key` must return a tuple of JSON serializable values that is unique per
+    object. When an `after` cursor is given the ranking resumes right after the
+    object it was taken from, ignoring `page_num`.
+    """
+    if after is not None:
+        after_key = decode_cursor(after, key(objects[0]) if objects else None)
+        objects = [obj for obj in objects if key(obj) > after_key]
+        page_num = 1
+
+    paginator = Paginator(range(len(objects)), per_page)
+    page = paginator.page(page_num)
+    offset = (page.number - 1) * paginator.per_page
+    top_k = heapq.nsmallest(offset + paginator.per_page, objects, key=key)
+    page_objects = top_k[offset:]
+
+    next_cursor = None
+    if page.has_next():
+        next_cursor = encode_cursor(key(page_objects[-1]))
+
+    has_cursor = after is not None
+    response = {
+        "count": paginator.count,
+        "next": page.next_page_number() if page.has_next() and not has_cursor else None,
+        "previous": page.previous_page_number() if page.has_previous() else None,
+        "next_cursor": next_cursor,
+        "results": serialize(page_objects) if serialize else page_objects,
+    }
+    return response
@@ -0,0 +1,95 @@
+from math import asin, cos, degrees, radians, sin
+
+import numpy as np
+
+# Same mean earth radius used by the `haversine` package
+EARTH_RADIUS_IN_KILOMETERS = 6371.0088
+
+
+class BatchDistance:
+    """
+    Computes the haversine distance between one origin and many destinations
+    in a single vectorized pass.
+    """
+
+    def __init__(self, origin):
+        latitude, longitude = origin
+        self.origin_latitude = np.radians(float(latitude))
+        self.origin_longitude = np.radians(float(longitude))
+
+    def distances(self, coordinates):
+        """
+        Returns the distance in kilometers to every (latitude, longitude)
+        pair in `coordinates`, in the same order.
+        """
+        coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        latitudes = np.radians(coordinates[:, 0])
+        longitudes = np.radians(coordinates[:, 1])
+
+        lat_delta = latitudes - self.origin_latitude
+        lon_delta = longitudes - self.origin_longitude
+        d = (
+            np.sin(lat_delta * 0.5) ** 2
+            + np.cos(self.origin_latitude)
+            * np.cos(latitudes)
+            * np.sin(lon_delta * 0.5) ** 2
+        )
+        return 2 * EARTH_RADIUS_IN_KILOMETERS * np.arcsin(np.sqrt(d))
+
+    @staticmethod
+    def within_radius(distances, radius_in_kilometers):
+        "Boolean mask of the distances that fall inside the radius"
+        return distances <= radius_in_kilometers
+
+    @staticmethod
+    def nearest(distances, k=None):
+        "Indices of the `k` smallest distances, nearest first"
+        if k is None or k >= len(distances):
+            return np.argsort(distances, kind="stable")
+
+        if k <= 0:
+            return np.array([], dtype=np.intp)
+
+        candidates = np.argpartition(distances, k - 1)[:k]
+        return candidates[np.argsort(distances[candidates], kind="stable")]
+
+
+def bounding_box(origin, radius_in_kilometers):
+    """
+    Returns the (min_lat, min_lon, max_lat, max_lon) box enclosing the circle
+    around `origin`. Longitudes may fall outside [-180, 180] when the circle
+    crosses the antimeridian, and span the whole globe when it covers a pole.
+    """
+    latitude, longitude = float(origin[0]), float(origin[1])
+    angular_radius = radius_in_kilometers / EARTH_RADIUS_IN_KILOMETERS
+    lat_delta = degrees(angular_radius)
+    min_lat, max_lat = latitude - lat_delta, latitude + lat_delta
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0
+
+    ratio = sin(angular_radius) / cos(radians(latitude))
+    if ratio >= 1.0:
+        return min_lat, -180.0, max_lat, 180.0
+
+    lon_delta = degrees(asin(ratio))
+    return min_lat, longitude - lon_delta, max_lat, longitude + lon_delta
+
+
+def within_bounding_box(coordinates, box):
+    """
+    Boolean mask of the (latitude, longitude) pairs in `coordinates` that fall
+    inside a box returned by `bounding_box`, splitting it at the antimeridian.
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+    latitudes, longitudes = coordinates[:, 0], coordinates[:, 1]
+    min_lat, min_lon, max_lat, max_lon = box
+
+    mask = (latitudes >= min_lat) & (latitudes <= max_lat)
+    if min_lon < -180.0:
+        mask &= (longitudes >= min_lon + 360.0) | (longitudes <= max_lon)
+    elif max_lon > 180.0:
+        mask &= (longitudes >= min_lon) | (longitudes <= max_lon - 360.0)
+    else:
+        mask &= (longitudes >= min_lon) & (longitudes <= max_lon)
+
+    return mask
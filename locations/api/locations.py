@@ -1,13 +1,28 @@
+from collections import namedtuple
+
+import numpy as np
 from haversine import haversine
 
-from django.db.models import Prefetch, Count
+from django.db.models import F, OuterRef, Subquery
 
-from stores.models import Store, Product, StoreHasProduct
+from stores.models import Store, StoreHasProduct, Promotion
+from stores.api.catalog import get_catalog
+from stores.api.schedules import (
+    caracas_now,
+    is_open,
+    prefetch_schedule_today,
+    schedule_today_prefetch,
+)
 from stores.serializers import (
     StoreSerializer,
     PromotionSerializer,
 )
 
+from locations.api.distance import (
+    BatchDistance,
+    bounding_box,
+    within_bounding_box,
+)
 from locations.serializers import (
     ProductNearbySerializer,
     StoreNearbySerializer,
@@ -15,6 +30,9 @@ from locations.serializers import (
 )
 
 
+PriceCandidate = namedtuple("PriceCandidate", ["id", "store_id", "price", "distance"])
+
+
 class GeoCoordinate:
     def __init__(self, latitude, longitude):
         self.latitude = float(latitude)
@@ -34,97 +52,254 @@ class SearchLocationsNearby:
         self.origin = (location.latitude, location.longitude)
         self.search_radius_in_kilometers = radius
         self.get_all_stores = get_all_stores
+        self.distance_engine = BatchDistance(self.origin)
+        # Schedules are checked against the same moment for every store
+        self.now = caracas_now()
 
-    def distance_to_destination(self, destination):
-        destination_coords = (destination.latitude, destination.longitude)
-        return haversine(self.origin, destination_coords)
-
-    def is_nearby(self, destination):
+    def distances_to_destinations(self, destinations):
+        """
+        Returns the distance to every destination and a mask telling which
+        of them are inside the search radius, both computed in one batch.
+        """
+        coordinates = [
+            (destination.latitude, destination.longitude)
+            for destination in destinations
+        ]
+        distances = self.distance_engine.distances(coordinates)
         if self.get_all_stores:
-            return True
-        distance = self.distance_to_destination(destination)
-        return distance <= self.search_radius_in_kilometers
+            nearby_mask = np.ones(len(distances), dtype=bool)
+        else:
+            nearby_mask = self.distance_engine.within_radius(
+                distances, self.search_radius_in_kilometers
+            )
+
+        return distances, nearby_mask
+
+    def catalog_distances(self, catalog):
+        """
+        Returns the positions of the catalog records inside the search radius,
+        nearest first, alongside the distance to every record in the catalog.
+        """
+        candidates = np.arange(len(catalog))
+        if not self.get_all_stores:
+            box = bounding_box(self.origin, self.search_radius_in_kilometers)
+            candidates = candidates[within_bounding_box(catalog.coordinates, box)]
+
+        distances = np.full(len(catalog), np.inf)
+        distances[candidates] = self.distance_engine.distances(
+            catalog.coordinates[candidates]
+        )
+        if not self.get_all_stores:
+            candidates = candidates[
+                self.distance_engine.within_radius(
+                    distances[candidates], self.search_radius_in_kilometers
+                )
+            ]
+
+        nearest = self.distance_engine.nearest(distances[candidates])
+        return candidates[nearest], distances
+
+    def search_stores_nearby(
+        self, product_id=None, store_name=None, store_id=None, open_now=False
+    ):
+        """
+        Returns the catalog records of the stores inside the search radius,
+        nearest first, alongside their distance. Nothing is serialized.
+        """
+        catalog = get_catalog()
+        positions, distances = self.catalog_distances(catalog)
 
-    def __find_stores_nearby(self, product_id=None, store_name=None, store_id=None):
-        queryset = Store.objects.filter(verified=True).prefetch_related("location")
         if product_id is not None:
-            queryset = queryset.filter(products__in=[product_id])
+            product_id = int(product_id)
 
         if store_name is not None:
-            queryset = queryset.filter(name__icontains=store_name)
+            store_name = store_name.lower()
 
         if store_id is not None:
-            queryset = queryset.filter(id=store_id)
+            store_id = int(store_id)
 
-        stores = list(queryset)
-        stores_nearby = [
-            {"store": store, "distance": self.distance_to_destination(store.location)}
-            for store in stores
-            if store.location and self.is_nearby(store.location)
-        ]
+        stores_nearby = []
+        for position in positions:
+            record = catalog.records[position]
+            if product_id is not None and product_id not in record.product_ids:
+                continue
+
+            if store_name is not None and store_name not in record.name.lower():
+                continue
+
+            if store_id is not None and record.id != store_id:
+                continue
+
+            if open_now and not is_open(record.schedule_on(self.now), self.now):
+                continue
+
+            stores_nearby.append(
+                {"store": record, "distance": float(distances[position])}
+            )
 
         return stores_nearby
 
+    def serialize_stores(self, stores_nearby):
+        distances = {store["store"].id: store["distance"] for store in stores_nearby}
+        return [
+            {
+                **store,
+                "store": StoreNearbySerializer(
+                    store["store"], context={"distances": distances, "now": self.now}
+                ).data,
+            }
+            for store in stores_nearby
+        ]
+
     def find_stores_nearby(self, product_id=None, store_name=None):
-        stores_nearby = self.__find_stores_nearby(product_id, store_name)
-        for store in stores_nearby:
-            store["store"] = StoreNearbySerializer(
-                store["store"], context={"distance_func": self.distance_to_destination}
-            ).data
+        stores_nearby = self.search_stores_nearby(product_id, store_name)
+        return self.serialize_stores(stores_nearby)
 
-        return stores_nearby
+    def nearby_stores_distances(self):
+        "Maps the id of every store inside the search radius to its distance"
+        return {
+            store["store"].id: store["distance"]
+            for store in self.search_stores_nearby()
+        }
 
-    def find_products_nearby(self):
-        filter = StoreHasProduct.objects.order_by("price")
-        products_with_prices = (
-            Product.objects.prefetch_related(
-                Prefetch("store_prices", filter, to_attr="prices"),
-            )
-            .annotate(Count("store_prices"))
-            .filter(store_prices__count__gt=0)
+    def find_best_offers(self, store_distances):
+        """
+        Returns the cheapest offer of every product among the given stores,
+        ties are broken by picking the nearest store.
+        """
+        nearby_offers = StoreHasProduct.objects.filter(store__in=list(store_distances))
+        cheapest_price = (
+            nearby_offers.filter(product=OuterRef("product"))
+            .order_by("price")
+            .values("price")[:1]
+        )
+        cheapest_offers = (
+            nearby_offers.annotate(cheapest_price=Subquery(cheapest_price))
+            .filter(price=F("cheapest_price"))
+            .select_related("product", "store__location")
+        )
+        cheapest_offers = prefetch_schedule_today(
+            cheapest_offers, self.now, prefix="store__"
         )
 
-        serializer = ProductNearbySerializer(products_with_prices, many=True)
-        products = serializer.data
-        products_nearby = []
-        for product in products:
-            store_loc = product["best_offer"]["store"]["location"]
-            destination = GeoCoordinate(store_loc["latitude"], store_loc["longitude"])
-            product["best_offer"]["distance"] = self.distance_to_destination(
-                destination
+        best_offers = {}
+        for offer in cheapest_offers:
+            offer.distance = store_distances[offer.store_id]
+            current_best = best_offers.get(offer.product_id)
+            if current_best is None or offer.distance < current_best.distance:
+                best_offers[offer.product_id] = offer
+
+        return list(best_offers.values())
+
+    def search_products_nearby(self):
+        "Products having an offer inside the search radius, with their best offer"
+        products = []
+        for offer in self.find_best_offers(self.nearby_stores_distances()):
+            product = offer.product
+            product.best_offer = offer
+            products.append(product)
+
+        return products
+
+    def serialize_products(self, products):
+        return ProductNearbySerializer(
+            products, many=True, context={"now": self.now}
+        ).data
+
+    def find_products_nearby(self):
+        return self.serialize_products(self.search_products_nearby())
+
+    def search_product_prices(self, product_id):
+        """
+        Offers of the product from the stores inside the search radius. Only
+        what's needed to rank them is loaded, `serialize_product_prices` loads
+        the rest for the offers in the page.
+        """
+        catalog = get_catalog()
+        positions, distances = self.catalog_distances(catalog)
+        store_distances = {
+            catalog.records[position].id: float(distances[position])
+            for position in positions
+        }
+
+        offers = StoreHasProduct.objects.filter(product=product_id)
+        if not self.get_all_stores:
+            offers = offers.filter(store__in=list(store_distances))
+
+        return [
+            PriceCandidate(offer_id, store_id, price, store_distances[store_id])
+            for offer_id, store_id, price in offers.order_by("price").values_list(
+                "id", "store", "price"
             )
-            if self.is_nearby(destination):
-                products_nearby.append(product)
+            if store_id in store_distances
+        ]
 
-        return products_nearby
+    def serialize_product_prices(self, candidates):
+        offers = (
+            StoreHasProduct.objects.select_related("store__location", "store__user")
+            .prefetch_related(schedule_today_prefetch(self.now, "store__"))
+            .in_bulk([candidate.id for candidate in candidates])
+        )
+        prices = []
+        for candidate in candidates:
+            price = offers.get(candidate.id)
+            if price is not None:
+                price.distance = candidate.distance
+                prices.append(price)
+
+        serializer = PriceSerializer(prices, many=True, context={"now": self.now})
+        return [
+            {**price_data, "distance": price.distance}
+            for price, price_data in zip(prices, serializer.data)
+        ]
 
     def find_product_prices(self, product_id):
-        prices_qs = StoreHasProduct.objects.filter(product=product_id)
-        serializer = PriceSerializer(prices_qs, many=True)
-        prices = serializer.data
-        for price in prices:
-            store_loc = price["store"]["location"]
-            destination = GeoCoordinate(store_loc["latitude"], store_loc["longitude"])
-            price["distance"] = self.distance_to_destination(destination)
+        return self.serialize_product_prices(self.search_product_prices(product_id))
 
-        return prices
+    def search_promotions_nearby(self, store_id=None):
+        """
+        Promotions offered by the stores inside the search radius, ordered by
+        the distance to their store.
+        """
+        stores_nearby = self.search_stores_nearby(store_id=store_id)
+        promotions_by_store = {}
+        nearby_ids = [store["store"].id for store in stores_nearby]
+        for promotion in Promotion.objects.filter(store__in=nearby_ids):
+            promotions_by_store.setdefault(promotion.store_id, []).append(promotion)
 
-    def find_promotions_nearby(self, store_id=None):
-        stores_nearby = self.__find_stores_nearby(store_id=store_id)
         promotions = []
-
         for store in stores_nearby:
-            if not store["store"].promotion_set.exists():
-                continue
-
-            store_promotions = PromotionSerializer(
-                store["store"].promotion_set.all(), depth=1, many=True
-            ).data
-            store_data = StoreSerializer(store["store"]).data
-            store_promotions = [
-                {**promotion, "distance": store["distance"], "store": store_data}
-                for promotion in store_promotions
-            ]
-            promotions += store_promotions
+            for promotion in promotions_by_store.get(store["store"].id, []):
+                promotion.distance = store["distance"]
+                promotions.append(promotion)
 
         return promotions
+
+    def serialize_promotions(self, promotions):
+        stores = prefetch_schedule_today(
+            Store.objects.select_related("location", "user"), self.now
+        ).in_bulk({promotion.store_id for promotion in promotions})
+        for promotion in promotions:
+            promotion.store = stores[promotion.store_id]
+
+        stores_data = {}
+        promotions_data = PromotionSerializer(promotions, depth=1, many=True).data
+        serialized = []
+        for promotion, promotion_data in zip(promotions, promotions_data):
+            if promotion.store_id not in stores_data:
+                stores_data[promotion.store_id] = StoreSerializer(
+                    promotion.store, context={"now": self.now}
+                ).data
+
+            serialized.append(
+                {
+                    **promotion_data,
+                    "distance": promotion.distance,
+                    "store": stores_data[promotion.store_id],
+                }
+            )
+
+        return serialized
+
+    def find_promotions_nearby(self, store_id=None):
+        return self.serialize_promotions(self.search_promotions_nearby(store_id))
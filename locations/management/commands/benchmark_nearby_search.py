@@ -0,0 +1,133 @@
+import random
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import User
+from stores.models import Store
+from locations.models import Location
+from locations.api.locations import GeoCoordinate, SearchLocationsNearby
+from stores.api.catalog import get_catalog, invalidate_catalog
+
+# Rough bounding box of Venezuela
+MIN_LATITUDE, MAX_LATITUDE = 0.65, 12.2
+MIN_LONGITUDE, MAX_LONGITUDE = -73.35, -59.8
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the latency of nearby store searches scanning every store "
+        "against the in-memory catalog over synthetic stores. Nothing is persisted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000])
+        parser.add_argument("--radius", type=float, default=50.0)
+        parser.add_argument("--searches", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=1234)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        origins = [
+            GeoCoordinate(
+                rng.uniform(MIN_LATITUDE, MAX_LATITUDE),
+                rng.uniform(MIN_LONGITUDE, MAX_LONGITUDE),
+            )
+            for _ in range(options["searches"])
+        ]
+
+        for size in options["sizes"]:
+            try:
+                with transaction.atomic():
+                    self.create_synthetic_stores(size, rng)
+                    self.report(size, origins, options["radius"])
+                    raise Rollback()
+            except Rollback:
+                pass
+            finally:
+                invalidate_catalog()
+
+    def create_synthetic_stores(self, size, rng):
+        self.stdout.write(f"Creating {size} synthetic stores...")
+        users = User.objects.bulk_create(
+            [
+                User(
+                    username=f"benchmark_store_{i}",
+                    email=f"benchmark_store_{i}@benchmark.test",
+                    type=User.Type.STORE.value,
+                )
+                for i in range(size)
+            ],
+            batch_size=5000,
+        )
+
+        locations = Location.objects.bulk_create(
+            [
+                Location(
+                    latitude=rng.uniform(MIN_LATITUDE, MAX_LATITUDE),
+                    longitude=rng.uniform(MIN_LONGITUDE, MAX_LONGITUDE),
+                )
+                for _ in range(size)
+            ],
+            batch_size=5000,
+        )
+
+        Store.objects.bulk_create(
+            [
+                Store(
+                    user=user,
+                    location=location,
+                    name=f"Benchmark store {i}",
+                    verified=True,
+                )
+                for i, (user, location) in enumerate(zip(users, locations))
+            ],
+            batch_size=5000,
+        )
+        invalidate_catalog()
+
+    def report(self, size, origins, radius):
+        full_scan_rows = full_scan_time = 0
+        catalog_time = 0
+        matches = 0
+
+        start = perf_counter()
+        get_catalog()
+        catalog_build_time = perf_counter() - start
+
+        for origin in origins:
+            searcher = SearchLocationsNearby(origin, radius)
+
+            start = perf_counter()
+            stores = list(
+                Store.objects.filter(verified=True).select_related("location")
+            )
+            _, nearby_mask = searcher.distances_to_destinations(
+                [store.location for store in stores]
+            )
+            full_scan_time += perf_counter() - start
+            full_scan_rows += len(stores)
+            matches += int(nearby_mask.sum())
+
+            start = perf_counter()
+            searcher.search_stores_nearby()
+            catalog_time += perf_counter() - start
+
+        searches = len(origins)
+        self.stdout.write(
+            f"{size} stores, {radius} km radius, {searches} searches "
+            f"({matches / searches:.1f} stores in range on average)"
+        )
+        self.stdout.write(
+            f"  full scan: {full_scan_rows / searches:.1f} rows, "
+            f"{full_scan_time / searches * 1000:.2f} ms per search"
+        )
+        self.stdout.write(
+            f"  catalog: built in {catalog_build_time * 1000:.2f} ms, "
+            f"{catalog_time / searches * 1000:.2f} ms per search"
+        )
@@ -1,7 +1,13 @@
 from rest_framework import serializers
 
 from stores.models import Product, StoreHasProduct, Store
-from stores.serializers import StoreSerializer, ScheduleDaySerializer
+from stores.serializers import (
+    StoreSerializer,
+    ScheduleDaySerializer,
+    serialize_schedule_today,
+)
+
+from stores.api.schedules import caracas_now
 
 from locations.models import Location
 
@@ -59,35 +65,31 @@ class ProductNearbySerializer(serializers.ModelSerializer):
         fields = ["id", "name", "photo", "best_offer"]
 
     def get_best_offer(self, obj):
-        return ProductNearbyPriceSerializer(obj.prices, many=True).data[0]
+        best_offer = ProductNearbyPriceSerializer(
+            obj.best_offer, context=self.context
+        ).data
+        best_offer["distance"] = obj.best_offer.distance
+        return best_offer
 
 
-class StoreNearbySerializer(StoreSerializer):
-    distance = serializers.SerializerMethodField()
+class StoreNearbySerializer(serializers.Serializer):
+    "Serializes the catalog record of a store found nearby"
 
-    class Meta:
-        model = Store
-        fields = [
-            "id",
-            "name",
-            "rating",
-            "reviews_count",
-            "distance",
-            "location_info",
-            "photo",
-            "schedule_today",
-        ]
-        read_only_fields = [
-            "id",
-            "name",
-            "rating",
-            "reviews_count",
-            "distance",
-            "location_info",
-            "photo",
-            "schedule_today",
-        ]
+    id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(read_only=True)
+    rating = serializers.FloatField(read_only=True)
+    reviews_count = serializers.IntegerField(read_only=True)
+    distance = serializers.SerializerMethodField()
+    location_info = serializers.SerializerMethodField()
+    photo = serializers.CharField(read_only=True)
+    schedule_today = serializers.SerializerMethodField()
 
     def get_distance(self, obj):
-        calculate_distance = self.context["distance_func"]
-        return calculate_distance(obj.location)
+        return self.context["distances"][obj.id]
+
+    def get_location_info(self, obj):
+        return {"latitude": obj.latitude, "longitude": obj.longitude}
+
+    def get_schedule_today(self, obj):
+        now = self.context.get("now") or caracas_now()
+        return serialize_schedule_today(obj.schedule_on(now), now)
@@ -1,5 +1,4 @@
 from django.core.exceptions import ValidationError
-from decimal import Decimal
 
 from rest_framework import status, viewsets
 from rest_framework.views import APIView
@@ -7,6 +6,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 
 from stores.models import UserHasFavoriteStore
+from stores.api.schedules import get_open_now
 
 from locations.api.locations import (
     GeoCoordinate,
@@ -17,7 +17,7 @@ from locations.api.locations import (
 from locations.models import Location
 from locations.serializers import LocationSerializer
 
-from common.serializers import paginate_objects
+from common.serializers import paginate_top_k
 
 
 def validate_location_views_query_params(query_params):
@@ -36,6 +36,15 @@ def validate_location_views_query_params(query_params):
     return latitude, longitude
 
 
+def paginate_nearby_results(request, candidates, key, serialize):
+    "Ranks `candidates` by `key` and serializes only the requested page"
+    query_params = request.query_params
+    page = query_params.get("page", 1)
+    page_size = query_params.get("pageSize", 15)
+    after = query_params.get("after", None)
+    return paginate_top_k(candidates, key, page, page_size, serialize, after)
+
+
 class LocationViewSet(viewsets.ModelViewSet):
     permission_classes = [AllowAny]
     queryset = Location.objects.all()
@@ -79,31 +88,24 @@ class FindStoresNearbyView(APIView):
         searcher = SearchLocationsNearby(origin, float(search_radius), get_all_stores)
         product = query_params.get("product", None)
         store_name = query_params.get("store_name", None)
-        places_nearby = searcher.find_stores_nearby(product, store_name)
-        favorited_stores_ids = [
-            obj["store"]
-            for obj in list(
-                UserHasFavoriteStore.objects.filter(user=self.request.user).values(
-                    "store"
-                )
+        open_now = get_open_now(query_params)
+        places_nearby = searcher.search_stores_nearby(
+            product, store_name, open_now=open_now
+        )
+        favorited_stores_ids = set(
+            UserHasFavoriteStore.objects.filter(user=self.request.user).values_list(
+                "store", flat=True
             )
-        ]
+        )
         for place in places_nearby:
-            place["in_favorites"] = place["store"]["id"] in favorited_stores_ids
+            place["in_favorites"] = place["store"].id in favorited_stores_ids
 
-        sorted_favorited = sorted(
-            [place for place in places_nearby if place["in_favorites"]],
-            key=lambda x: x["distance"],
-        )
-        sorted_not_favorited = sorted(
-            [place for place in places_nearby if not place["in_favorites"]],
-            key=lambda x: x["distance"],
+        response = paginate_nearby_results(
+            request,
+            places_nearby,
+            key=lambda x: (not x["in_favorites"], x["distance"], x["store"].id),
+            serialize=searcher.serialize_stores,
         )
-        sorted_places = sorted_favorited + sorted_not_favorited
-
-        page = request.query_params.get("page", 1)
-        page_size = request.query_params.get("pageSize", 15)
-        response = paginate_objects(sorted_places, page, page_size)
 
         return Response(response, status=status.HTTP_200_OK)
 
@@ -121,15 +123,14 @@ class FindProductsNearbyView(APIView):
         origin = GeoCoordinate(latitude, longitude)
 
         search_nearby = SearchLocationsNearby(origin, float(search_radius))
-        products = search_nearby.find_products_nearby()
-        
-        sorted_products = sorted(
-            products,
-            key=lambda x: (Decimal(x["best_offer"]["price"]), x["best_offer"]["distance"]))
+        products = search_nearby.search_products_nearby()
 
-        page = request.query_params.get("page", 1)
-        page_size = request.query_params.get("pageSize", 15)
-        response = paginate_objects(sorted_products, page, page_size)
+        response = paginate_nearby_results(
+            request,
+            products,
+            key=lambda x: (float(x.best_offer.price), x.best_offer.distance, x.id),
+            serialize=search_nearby.serialize_products,
+        )
 
         return Response(response, status=status.HTTP_200_OK)
 
@@ -144,16 +145,20 @@ class FindProductPricesView(APIView):
             return Response(e, status=status.HTTP_400_BAD_REQUEST)
 
         origin = GeoCoordinate(latitude, longitude)
-        searcher = SearchLocationsNearby(origin, 0.0, get_all_stores=True)
-        prices = searcher.find_product_prices(product_id)
+        search_radius = request.query_params.get("searchRadius", None)
+        if search_radius is None:
+            searcher = SearchLocationsNearby(origin, 0.0, get_all_stores=True)
+        else:
+            searcher = SearchLocationsNearby(origin, float(search_radius))
 
-        sorted_prices = sorted(
+        prices = searcher.search_product_prices(product_id)
+
+        response = paginate_nearby_results(
+            request,
             prices,
-            key=lambda x: (x["price"], x["distance"]),
+            key=lambda x: (float(x.price), x.distance, str(x.id)),
+            serialize=searcher.serialize_product_prices,
         )
-        page = request.query_params.get("page", 1)
-        page_size = request.query_params.get("pageSize", 15)
-        response = paginate_objects(sorted_prices, page, page_size)
 
         return Response(response, status=status.HTTP_200_OK)
 
@@ -171,10 +176,13 @@ class FindPromotionsNearbyView(APIView):
         origin = GeoCoordinate(latitude, longitude)
         search_nearby = SearchLocationsNearby(origin, float(search_radius))
         store_id = request.query_params.get("store_id", None)
-        promotions = search_nearby.find_promotions_nearby(store_id=store_id)
+        promotions = search_nearby.search_promotions_nearby(store_id=store_id)
 
-        page = request.query_params.get("page", 1)
-        page_size = request.query_params.get("pageSize", 15)
-        response = paginate_objects(promotions, page, page_size)
+        response = paginate_nearby_results(
+            request,
+            promotions,
+            key=lambda x: (x.distance, x.store_id, x.id),
+            serialize=search_nearby.serialize_promotions,
+        )
 
         return Response(response, status=status.HTTP_200_OK)
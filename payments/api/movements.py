@@ -0,0 +1,146 @@
+from django.db import transaction
+from django.db.models import F
+
+from rest_framework import serializers
+
+from payments.models import Movement
+from stores.models import PurchaseHasProduct
+
+MOVEMENT_RELATED_FIELDS = (
+    "purchase__user",
+    "purchase__store",
+    "purchase__gift_recipient",
+    "funding__user",
+    "admin_operation__admin",
+    "admin_operation__origin_account",
+    "admin_operation__destination_account",
+    "store_payment__store__user",
+)
+
+
+def select_movement_relations(queryset):
+    "Loads every relation a serialized movement reads along with the movements"
+    return queryset.select_related(*MOVEMENT_RELATED_FIELDS).prefetch_related(
+        "purchase__products", "purchase__promotions"
+    )
+
+
+def load_gift_products(movements):
+    """
+    Sets `gift_products` on the purchase of every gift movement: the products
+    bought, with their quantity and current price at the purchase's store.
+    Every purchase is loaded with a single query.
+    """
+    purchases = {}
+    for movement in movements:
+        if movement.movement_type in Movement.get_gift_types():
+            purchases[movement.purchase_id] = movement.purchase
+
+    if not purchases:
+        return
+
+    for purchase in purchases.values():
+        purchase.gift_products = []
+
+    lines = (
+        PurchaseHasProduct.objects.filter(
+            purchase__in=purchases.keys(),
+            product__store_prices__store=F("purchase__store"),
+        )
+        .order_by("product__created_at", "product_id")
+        .values_list(
+            "purchase", "product__name", "quantity", "product__store_prices__price"
+        )
+    )
+    for purchase_id, name, quantity, price in lines:
+        purchases[purchase_id].gift_products.append(
+            {
+                "name": name,
+                "purchasehasproduct__quantity": quantity,
+                "store_prices__price": price,
+            }
+        )
+
+
+MOVEMENTS_WITH_PURCHASE = [
+    Movement.Type.GIFT_RECEIVED.value,
+    Movement.Type.GIFT_SENT.value,
+    Movement.Type.GIFT_REJECTED.value,
+    Movement.Type.GIFT_CLAIMED.value,
+    Movement.Type.GIFT_REFUNDED.value,
+    Movement.Type.BAR_CLAIM_PAYMENT.value,
+]
+
+
+def validate_movement_relations(movement_type, purchase=None, funding=None):
+    "Checks a new movement points to what its type requires"
+    if movement_type in MOVEMENTS_WITH_PURCHASE and purchase is None:
+        raise serializers.ValidationError(
+            {
+                "type_&_purchase": f"Cannot create a Movement of type {movement_type} without a 'purchase'"
+            }
+        )
+    elif movement_type == Movement.Type.FUNDING.value and funding is None:
+        raise serializers.ValidationError(
+            {
+                "type_&_funding": f"Cannot create a Movement of type {movement_type} without a 'funding'"
+            }
+        )
+
+
+class MovementWriter:
+    """
+    Builds movements and writes them all with a single INSERT. Movements are
+    added in groups, one per operation, and every group gets its own
+    grouping id when saving.
+
+    `bulk_create` doesn't call `Movement.save`, so the fields it fills in
+    for new movements are set here before inserting.
+    """
+
+    def __init__(self):
+        self.groups = []
+
+    def add_group(self, movement_types, **relations):
+        """
+        Adds one movement of each type, all pointing to `relations` (purchase,
+        funding, admin_operation or store_payment). Raises a ValidationError
+        when a type lacks the relation it requires.
+        """
+        movements = []
+        for movement_type in movement_types:
+            if movement_type not in Movement.Type.values:
+                raise serializers.ValidationError(
+                    {"movement_type": f"Unknown movement type {movement_type}"}
+                )
+
+            movement = Movement(movement_type=movement_type, **relations)
+            validate_movement_relations(
+                movement_type, movement.purchase, movement.funding
+            )
+            movements.append(movement)
+
+        self.groups.append(movements)
+
+    def save(self):
+        "Writes the movements added so far, returns them"
+        if not self.groups:
+            return []
+
+        movements = []
+        for group in self.groups:
+            for movement in group:
+                movement.set_search_fields()
+                movement.set_owners()
+                movements.append(movement)
+
+        with transaction.atomic():
+            grouping_ids = Movement.objects.allocate_grouping_ids(len(self.groups))
+            for grouping_id, group in zip(grouping_ids, self.groups):
+                for movement in group:
+                    movement.grouping_id = grouping_id
+
+            movements = Movement.objects.bulk_create(movements)
+
+        self.groups = []
+        return movements
@@ -0,0 +1,83 @@
+import logging
+from decimal import Decimal
+from uuid import uuid4
+
+from redis.exceptions import RedisError
+
+from django.core.cache import cache
+from django.db.models import F, Sum
+
+from stores.api.store_balance import get_store_balances
+from stores.models import Store
+
+PAYOUT_TOTALS_VERSION_KEY = "payments:payout_totals:version"
+PAYOUT_TOTALS_TIMEOUT = 60
+
+logger = logging.getLogger("payout_totals")
+
+
+def get_payout_totals_version():
+    try:
+        version = cache.get(PAYOUT_TOTALS_VERSION_KEY)
+        if version is None:
+            cache.add(PAYOUT_TOTALS_VERSION_KEY, uuid4().hex, timeout=None)
+            version = cache.get(PAYOUT_TOTALS_VERSION_KEY)
+    except RedisError as e:
+        logger.error(f"Error reading the payout totals version: {str(e)}")
+        return
+
+    return version
+
+
+def invalidate_payout_totals():
+    "Discards every cached payout total"
+    try:
+        cache.set(PAYOUT_TOTALS_VERSION_KEY, uuid4().hex, timeout=None)
+    except RedisError as e:
+        logger.error(f"Error invalidating the payout totals: {str(e)}")
+
+
+def calculate_payout_totals(payments, store_id=None):
+    """
+    Returns what is still owed to the stores, or to a single store, and the
+    total paid with `payments`, both in USD.
+    """
+    if store_id is not None:
+        total_unpaid = Store.objects.get(pk=store_id).unpaid_balance
+    else:
+        total_unpaid = get_store_balances().aggregate(total=Sum("balance"))["total"]
+
+    paid = payments.order_by().aggregate(
+        total=Sum("amount"),
+        total_local_currency=Sum(F("amount") * F("usd_exchange_rate")),
+    )
+    return {
+        "total_unpaid": total_unpaid or Decimal(0),
+        "total_paid": paid["total"] or Decimal(0),
+        "total_paid_local_currency": paid["total_local_currency"] or Decimal(0),
+    }
+
+
+def get_payout_totals(payments, store_id=None, start_date=None, end_date=None):
+    """
+    Cached `calculate_payout_totals`. `payments` must be the store payments
+    filtered by the given store and dates, which are part of the cache key.
+    Totals are kept for a short time and discarded whenever a purchase is
+    delivered or a payment is made. They're calculated directly when the
+    cache is unavailable.
+    """
+    version = get_payout_totals_version()
+    if version is None:
+        return calculate_payout_totals(payments, store_id)
+
+    cache_key = f"payments:payout_totals:{version}:{store_id}:{start_date}:{end_date}"
+    try:
+        totals = cache.get(cache_key)
+        if totals is None:
+            totals = calculate_payout_totals(payments, store_id)
+            cache.set(cache_key, totals, timeout=PAYOUT_TOTALS_TIMEOUT)
+    except RedisError as e:
+        logger.error(f"Error reading the cached payout totals: {str(e)}")
+        totals = calculate_payout_totals(payments, store_id)
+
+    return totals
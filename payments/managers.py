@@ -1,11 +1,72 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Max
+
+GROUPING_ID_COUNTER = "movement_grouping_id"
+STORE_PAYMENT_REFERENCE_COUNTER = "store_payment_reference"
+
+
+class CounterManager(models.Manager):
+    def allocate(self, name, count=1, seed=0):
+        """
+        Reserves `count` consecutive values of the counter `name` and returns
+        them as a range. The counter row stays locked until the surrounding
+        transaction ends, so concurrent allocations never overlap. A missing
+        counter is created holding `seed`, or what it returns when callable,
+        as its last allocated value.
+        """
+        if count < 1:
+            raise ValueError("At least one value must be allocated")
+
+        with transaction.atomic():
+            self.get_or_create(name=name, defaults={"value": seed})
+            counter = self.select_for_update().get(name=name)
+            start = counter.value + 1
+            counter.value += count
+            counter.save(update_fields=["value"])
+
+        return range(start, start + count)
 
 
 class MovementManager(models.Manager):
+    def get_last_grouping_id(self):
+        "The highest grouping id in use, -1 when there are no movements"
+        last_grouping_id = self.aggregate(Max("grouping_id"))["grouping_id__max"]
+        return -1 if last_grouping_id is None else last_grouping_id
+
+    def allocate_grouping_ids(self, count):
+        "Reserves `count` new grouping ids, returns them as a range"
+        from payments.models import Counter
+
+        return Counter.objects.allocate(
+            GROUPING_ID_COUNTER, count, seed=self.get_last_grouping_id
+        )
+
     def get_next_grouping_id(self):
-        lastest_movement = self.order_by("created_at").last()
-        if lastest_movement is None:
-            return 0
+        return self.allocate_grouping_ids(1)[0]
+
+    def update_actor_username(self, user):
+        "Copies the current username of `user` to the movements it's behind"
+        username = user.username.lower()
+        # Same precedence as Movement.set_search_fields
+        self.filter(purchase__user=user).update(actor_username=username)
+        self.filter(purchase=None, funding__user=user).update(actor_username=username)
+        self.filter(purchase=None, funding=None, admin_operation__admin=user).update(
+            actor_username=username
+        )
+        self.filter(
+            purchase=None,
+            funding=None,
+            admin_operation=None,
+            store_payment__store__user=user,
+        ).update(actor_username=username)
 
-        prev_grouping_id = lastest_movement.grouping_id
-        return prev_grouping_id + 1
+    def update_store_name(self, store):
+        "Copies the current name of `store` to the movements involving it"
+        store_name = store.name.lower()
+        self.filter(purchase__store=store).update(store_name=store_name)
+        self.filter(
+            purchase=None,
+            funding=None,
+            admin_operation=None,
+            store_payment__store=store,
+        ).update(store_name=store_name)
@@ -0,0 +1,19 @@
+# Generated by Django 4.1.4 on 2026-10-16 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0003_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="storepayment",
+            index=models.Index(
+                fields=["created_at"], name="store_payment_created_at_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.4 on 2026-10-16 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0004_store_payment_created_at_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="movement",
+            index=models.Index(fields=["created_at"], name="movement_created_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="movement",
+            index=models.Index(
+                fields=["movement_type", "created_at"],
+                name="movement_type_created_at_idx",
+            ),
+        ),
+    ]
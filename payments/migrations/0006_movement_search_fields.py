@@ -0,0 +1,93 @@
+# Generated by Django 4.1.4 on 2026-10-16 17:00
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Lower
+
+
+def lowered(queryset, field):
+    "Lowercased `field` of the row of `queryset` a movement points to, or ''"
+    return Coalesce(Lower(Subquery(queryset.values(field)[:1])), Value(""))
+
+
+def backfill_search_fields(apps, schema_editor):
+    Movement = apps.get_model("payments", "Movement")
+    Purchase = apps.get_model("stores", "Purchase")
+    Funding = apps.get_model("payments", "Funding")
+    FundOperation = apps.get_model("administration", "FundOperation")
+    StorePayment = apps.get_model("payments", "StorePayment")
+
+    # Same precedence as Movement.set_search_fields
+    purchases = Purchase.objects.filter(pk=OuterRef("purchase_id"))
+    movements = Movement.objects.exclude(purchase=None)
+    movements.update(
+        actor_username=lowered(purchases, "user__username"),
+        store_name=lowered(purchases, "store__name"),
+    )
+
+    fundings = Funding.objects.filter(pk=OuterRef("funding_id"))
+    movements = Movement.objects.filter(purchase=None).exclude(funding=None)
+    movements.update(actor_username=lowered(fundings, "user__username"))
+
+    operations = FundOperation.objects.filter(pk=OuterRef("admin_operation_id"))
+    movements = Movement.objects.filter(purchase=None, funding=None).exclude(
+        admin_operation=None
+    )
+    movements.update(actor_username=lowered(operations, "admin__username"))
+
+    payments = StorePayment.objects.filter(pk=OuterRef("store_payment_id"))
+    movements = Movement.objects.filter(
+        purchase=None, funding=None, admin_operation=None
+    ).exclude(store_payment=None)
+    movements.update(
+        actor_username=lowered(payments, "store__user__username"),
+        store_name=lowered(payments, "store__name"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("administration", "0003_commissionrollup"),
+        ("stores", "0006_purchase_status_indexes"),
+        ("payments", "0005_movement_created_at_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movement",
+            name="actor_username",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Lowercased username of the user behind the movement, for searches",
+                max_length=150,
+            ),
+        ),
+        migrations.AddField(
+            model_name="movement",
+            name="store_name",
+            field=models.TextField(
+                blank=True,
+                default="",
+                help_text="Lowercased name of the store involved, if any, for searches",
+            ),
+        ),
+        migrations.RunPython(backfill_search_fields, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="movement",
+            index=models.Index(
+                fields=["actor_username"],
+                name="movement_actor_username_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="movement",
+            index=models.Index(
+                fields=["store_name"],
+                name="movement_store_name_idx",
+                opclasses=["text_pattern_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.1.4 on 2026-10-16 19:00
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_grouping_id_counter(apps, schema_editor):
+    Counter = apps.get_model("payments", "Counter")
+    Movement = apps.get_model("payments", "Movement")
+
+    last_grouping_id = Movement.objects.aggregate(Max("grouping_id"))[
+        "grouping_id__max"
+    ]
+    Counter.objects.create(
+        name="movement_grouping_id",
+        value=-1 if last_grouping_id is None else last_grouping_id,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0006_movement_search_fields"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Counter",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("value", models.BigIntegerField(help_text="Last value handed out")),
+            ],
+        ),
+        migrations.RunPython(seed_grouping_id_counter, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.1.4 on 2026-10-16 19:30
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def seed_reference_counter(apps, schema_editor):
+    Counter = apps.get_model("payments", "Counter")
+    StorePayment = apps.get_model("payments", "StorePayment")
+
+    last_reference = StorePayment.objects.aggregate(Max("reference"))["reference__max"]
+    Counter.objects.create(name="store_payment_reference", value=last_reference or 0)
+
+
+def remove_reference_counter(apps, schema_editor):
+    Counter = apps.get_model("payments", "Counter")
+    Counter.objects.filter(name="store_payment_reference").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0007_counter"),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_reference_counter, remove_reference_counter),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 4.1.4 on 2026-10-16 20:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+RECIPIENT_TYPES = ["GIFT_RECEIVED", "GIFT_CLAIMED"]
+
+
+def related(queryset, field):
+    "`field` of the row of `queryset` a movement points to"
+    return Subquery(queryset.values(field)[:1])
+
+
+def backfill_owners(apps, schema_editor):
+    Movement = apps.get_model("payments", "Movement")
+    Purchase = apps.get_model("stores", "Purchase")
+    Funding = apps.get_model("payments", "Funding")
+    FundOperation = apps.get_model("administration", "FundOperation")
+    StorePayment = apps.get_model("payments", "StorePayment")
+
+    # Same precedence as Movement.set_owners
+    purchases = Purchase.objects.filter(pk=OuterRef("purchase_id"))
+    movements = Movement.objects.exclude(purchase=None)
+    movements.filter(movement_type="BAR_CLAIM_PAYMENT").update(
+        owner_user=related(purchases, "store__user")
+    )
+    gift_movements = movements.exclude(movement_type="BAR_CLAIM_PAYMENT")
+    gift_movements.exclude(movement_type__in=RECIPIENT_TYPES).update(
+        owner_user=related(purchases, "user_id"),
+        counterparty_user=related(purchases, "gift_recipient_id"),
+    )
+    gift_movements.filter(movement_type__in=RECIPIENT_TYPES).update(
+        owner_user=related(purchases, "gift_recipient_id"),
+        counterparty_user=related(purchases, "user_id"),
+    )
+
+    fundings = Funding.objects.filter(pk=OuterRef("funding_id"))
+    movements = Movement.objects.filter(purchase=None).exclude(funding=None)
+    movements.update(owner_user=related(fundings, "user_id"))
+
+    operations = FundOperation.objects.filter(pk=OuterRef("admin_operation_id"))
+    movements = Movement.objects.filter(purchase=None, funding=None).exclude(
+        admin_operation=None
+    )
+    movements.update(owner_user=related(operations, "admin_id"))
+
+    payments = StorePayment.objects.filter(pk=OuterRef("store_payment_id"))
+    movements = Movement.objects.filter(
+        purchase=None, funding=None, admin_operation=None
+    ).exclude(store_payment=None)
+    movements.update(owner_user=related(payments, "store__user"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("administration", "0004_storebalancesnapshot"),
+        ("stores", "0008_alter_store_dispatch_code"),
+        ("payments", "0008_store_payment_reference_counter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movement",
+            name="owner_user",
+            field=models.ForeignKey(
+                db_index=False,
+                help_text="User whose movements feed the movement belongs to",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="movement",
+            name="counterparty_user",
+            field=models.ForeignKey(
+                db_index=False,
+                help_text="The other user involved in the movement, if any",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(backfill_owners, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="movement",
+            index=models.Index(
+                fields=["owner_user", "-created_at"],
+                name="movement_owner_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="movement",
+            index=models.Index(
+                fields=["counterparty_user", "-created_at"],
+                name="movement_counterparty_idx",
+            ),
+        ),
+    ]
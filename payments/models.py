@@ -7,7 +7,11 @@ from django.db.models import Sum, F
 
 from common.models import TimeStampedModel
 
-from payments.managers import MovementManager
+from payments.managers import (
+    STORE_PAYMENT_REFERENCE_COUNTER,
+    CounterManager,
+    MovementManager,
+)
 
 
 # Create your models here.
@@ -137,6 +141,11 @@ class StorePayment(TimeStampedModel):
         help_text="USD exchange rate when the payment ocurred",
     )
 
+    class Meta(TimeStampedModel.Meta):
+        indexes = [
+            models.Index(fields=["created_at"], name="store_payment_created_at_idx")
+        ]
+
     @property
     def amount_local_currency(self):
         return self.amount * self.usd_exchange_rate
@@ -151,13 +160,19 @@ class StorePayment(TimeStampedModel):
 
         return commissions * self.usd_exchange_rate
 
+    @staticmethod
+    def get_last_reference():
+        "The highest reference in use, 0 when there are no payments"
+        last_reference = StorePayment.objects.aggregate(models.Max("reference"))[
+            "reference__max"
+        ]
+        return last_reference or 0
+
     def save(self, *args, **kwargs):
         if self._state.adding:
-            last_payment = StorePayment.objects.order_by("created_at").last()
-            if last_payment is None:
-                self.reference = 1
-            else:
-                self.reference = last_payment.reference + 1
+            self.reference = Counter.objects.allocate(
+                STORE_PAYMENT_REFERENCE_COUNTER, seed=StorePayment.get_last_reference
+            )[0]
 
         return super(StorePayment, self).save(*args, **kwargs)
 
@@ -199,9 +214,113 @@ class Movement(TimeStampedModel):
         "administration.FundOperation", on_delete=models.CASCADE, null=True
     )
     store_payment = models.ForeignKey(StorePayment, on_delete=models.CASCADE, null=True)
+    actor_username = models.CharField(
+        max_length=150,
+        blank=True,
+        default="",
+        help_text="Lowercased username of the user behind the movement, for searches",
+    )
+    store_name = models.TextField(
+        blank=True,
+        default="",
+        help_text="Lowercased name of the store involved, if any, for searches",
+    )
+    owner_user = models.ForeignKey(
+        "users.User",
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="+",
+        db_index=False,
+        help_text="User whose movements feed the movement belongs to",
+    )
+    counterparty_user = models.ForeignKey(
+        "users.User",
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="+",
+        db_index=False,
+        help_text="The other user involved in the movement, if any",
+    )
 
     objects = MovementManager()
 
+    class Meta(TimeStampedModel.Meta):
+        indexes = [
+            models.Index(fields=["created_at"], name="movement_created_at_idx"),
+            models.Index(
+                fields=["movement_type", "created_at"],
+                name="movement_type_created_at_idx",
+            ),
+            # Pattern operator classes let Postgres use the indexes for
+            # prefix (LIKE 'term%') searches under any collation
+            models.Index(
+                fields=["actor_username"],
+                name="movement_actor_username_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+            models.Index(
+                fields=["store_name"],
+                name="movement_store_name_idx",
+                opclasses=["text_pattern_ops"],
+            ),
+            models.Index(
+                fields=["owner_user", "-created_at"],
+                name="movement_owner_created_idx",
+            ),
+            models.Index(
+                fields=["counterparty_user", "-created_at"],
+                name="movement_counterparty_idx",
+            ),
+        ]
+
+    def set_search_fields(self):
+        "Copies the names the admin movements list searches by from the relations"
+        actor = store = None
+        if self.purchase is not None:
+            actor, store = self.purchase.user, self.purchase.store
+        elif self.funding is not None:
+            actor = self.funding.user
+        elif self.admin_operation is not None:
+            actor = self.admin_operation.admin
+        elif self.store_payment is not None:
+            store = self.store_payment.store
+            actor = store.user
+
+        self.actor_username = actor.username.lower() if actor is not None else ""
+        self.store_name = store.name.lower() if store is not None else ""
+
+    def set_owners(self):
+        """
+        Sets the user whose feed the movement belongs to and the other user
+        involved. Gifts belong to their sender, except the movements only the
+        recipient sees, which have the sender as counterparty.
+        """
+        owner_id = counterparty_id = None
+        if self.movement_type == Movement.Type.BAR_CLAIM_PAYMENT:
+            if self.purchase.store is not None:
+                owner_id = self.purchase.store.user_id
+        elif self.purchase is not None:
+            owner_id = self.purchase.user_id
+            counterparty_id = self.purchase.gift_recipient_id
+            if self.movement_type in Movement.get_recipient_types():
+                owner_id, counterparty_id = counterparty_id, owner_id
+        elif self.funding is not None:
+            owner_id = self.funding.user_id
+        elif self.admin_operation is not None:
+            owner_id = self.admin_operation.admin_id
+        elif self.store_payment is not None:
+            owner_id = self.store_payment.store.user_id
+
+        self.owner_user_id = owner_id
+        self.counterparty_user_id = counterparty_id
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.set_search_fields()
+            self.set_owners()
+
+        return super(Movement, self).save(*args, **kwargs)
+
     @staticmethod
     def get_gift_types():
         return [
@@ -214,6 +333,11 @@ class Movement(TimeStampedModel):
             Movement.Type.BAR_CLAIM_PAYMENT,
         ]
 
+    @staticmethod
+    def get_recipient_types():
+        "Gift movements owned by the recipient instead of the sender"
+        return [Movement.Type.GIFT_RECEIVED, Movement.Type.GIFT_CLAIMED]
+
     @staticmethod
     def get_operation_types():
         return [
@@ -222,3 +346,12 @@ class Movement(TimeStampedModel):
             Movement.Type.FUNDS_EXCHANGE_ORIGIN,
             Movement.Type.FUNDS_EXCHANGE_DESTINATION,
         ]
+
+
+class Counter(models.Model):
+    """Named counter handing out unique consecutive numbers"""
+
+    name = models.CharField(max_length=64, primary_key=True)
+    value = models.BigIntegerField(help_text="Last value handed out")
+
+    objects = CounterManager()
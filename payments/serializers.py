@@ -18,10 +18,20 @@ from payments.models import (
     StorePayment,
     Movement,
 )
-from stores.models import Purchase, PurchaseHasProduct, PurchaseHasPromotion
-from stores.serializers import PurchaseSerializer
+from stores.models import Purchase
+from stores.serializers import PurchaseSerializer, PurchaseLinesListSerializer
 
-from stores.api.store_balance import calculate_store_balance
+from stores.api.store_balance import (
+    get_store_balances,
+    get_unpaid_purchase_ids,
+    settle_purchases,
+)
+from stores.api.purchase_lines import get_product_lines, get_promotion_lines
+from payments.api.movements import (
+    MovementWriter,
+    load_gift_products,
+    validate_movement_relations,
+)
 
 from administration.models import FundAccount
 
@@ -75,14 +85,9 @@ class FundingSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         with transaction.atomic():
             funding = super().create(validated_data)
-            movement_data = {
-                "movement_type": Movement.Type.FUNDING.value,
-                "funding": funding.id,
-                "grouping_id": Movement.objects.get_next_grouping_id(),
-            }
-            movement_serializer = MovementSerializer(data=movement_data)
-            movement_serializer.is_valid(raise_exception=True)
-            movement_serializer.save()
+            movement_writer = MovementWriter()
+            movement_writer.add_group([Movement.Type.FUNDING], funding=funding)
+            movement_writer.save()
             return funding
 
 
@@ -159,6 +164,7 @@ class StorePaymentPurchaseSerializer(serializers.ModelSerializer):
             "promotions",
         ]
         read_only_fields = ["gift_recipient", "products"]
+        list_serializer_class = PurchaseLinesListSerializer
 
     def get_gift_recipient(self, obj):
         return {
@@ -167,22 +173,33 @@ class StorePaymentPurchaseSerializer(serializers.ModelSerializer):
         }
 
     def get_products(self, obj):
-        purchases_products = (
-            PurchaseHasProduct.objects.filter(purchase=obj.pk)
-            .values("product")
-            .distinct()
-            .values("product", "product__name", "quantity")
-        )
-        return purchases_products
+        products = {}
+        for line in get_product_lines(obj):
+            products.setdefault(
+                (line.product_id, line.quantity),
+                {
+                    "product": line.product_id,
+                    "product__name": line.product.name,
+                    "quantity": line.quantity,
+                },
+            )
+
+        return list(products.values())
 
     def get_promotions(self, obj):
-        purchases_products = (
-            PurchaseHasPromotion.objects.filter(purchase=obj.pk)
-            .values("promotion")
-            .distinct()
-            .values("promotion", "promotion__title", "quantity", "promotion__price")
-        )
-        return purchases_products
+        promotions = {}
+        for line in get_promotion_lines(obj):
+            promotions.setdefault(
+                (line.promotion_id, line.quantity),
+                {
+                    "promotion": line.promotion_id,
+                    "promotion__title": line.promotion.title,
+                    "quantity": line.quantity,
+                    "promotion__price": line.promotion.price,
+                },
+            )
+
+        return list(promotions.values())
 
 
 class StorePaymentSerializer(serializers.ModelSerializer):
@@ -237,8 +254,10 @@ class StorePaymentSerializer(serializers.ModelSerializer):
             )
 
         store = data["store"]
-        balances_by_store = calculate_store_balance(store.id)
-        store_balance = balances_by_store.get(store=store.id)
+        # The view may have read the balance already, to fill in the amount
+        store_balance = self.context.get("store_balance")
+        if store_balance is None or store_balance.pk != store.id:
+            store_balance = get_store_balances().get(pk=store.id)
 
         amount_owed = round_to_fixed_exponent(store_balance.balance)
         if amount != amount_owed:
@@ -248,7 +267,7 @@ class StorePaymentSerializer(serializers.ModelSerializer):
                 }
             )
 
-        data["purchases"] = [p.id for p in store_balance.unpaid_purchases]
+        data["purchases"] = get_unpaid_purchase_ids(store.id)
 
         return data
 
@@ -257,16 +276,13 @@ class StorePaymentSerializer(serializers.ModelSerializer):
         with transaction.atomic():
             store_payment = super().create(validated_data)
             purchases = Purchase.objects.filter(pk__in=purchases_ids)
-            purchases.update(store_payment=store_payment)
+            settle_purchases(store_payment, purchases)
 
-            movement_data = {
-                "movement_type": Movement.Type.ADMIN_BAR_PAYMENT,
-                "store_payment": store_payment.id,
-                "grouping_id": Movement.objects.get_next_grouping_id(),
-            }
-            movement_serializer = MovementSerializer(data=movement_data)
-            movement_serializer.is_valid(raise_exception=True)
-            movement_serializer.save()
+            movement_writer = MovementWriter()
+            movement_writer.add_group(
+                [Movement.Type.ADMIN_BAR_PAYMENT], store_payment=store_payment
+            )
+            movement_writer.save()
 
             fund_account_origin = store_payment.funds_account_origin
             amount_to_extract = store_payment.amount
@@ -344,42 +360,23 @@ class MovementSerializer(serializers.ModelSerializer):
         return funding_serializer.data
 
     def validate(self, attrs):
-        purchase = attrs.get("purchase")
-        funding = attrs.get("funding")
-
         if self.instance:
             # we're in an update
             return attrs
 
-        movement_type = attrs.get("movement_type")
-        movements_with_purchase = [
-            Movement.Type.GIFT_RECEIVED.value,
-            Movement.Type.GIFT_SENT.value,
-            Movement.Type.GIFT_REJECTED.value,
-            Movement.Type.GIFT_CLAIMED.value,
-            Movement.Type.GIFT_REFUNDED.value,
-            Movement.Type.BAR_CLAIM_PAYMENT.value,
-        ]
-        movements_with_funding = [
-            Movement.Type.FUNDING.value,
-            Movement.Type.ADMIN_FUNDING.value,
-        ]
-        if movement_type in movements_with_purchase and purchase is None:
-            raise serializers.ValidationError(
-                {
-                    "type_&_purchase": f"Cannot create a Movement of type {movement_type} without a 'purchase'"
-                }
-            )
-        elif movement_type == Movement.Type.FUNDING.value and funding is None:
-            raise serializers.ValidationError(
-                {
-                    "type_&_funding": f"Cannot create a Movement of type {movement_type} without a 'funding'"
-                }
-            )
-
+        validate_movement_relations(
+            attrs.get("movement_type"), attrs.get("purchase"), attrs.get("funding")
+        )
         return attrs
 
 
+class ReadOnlyMovementListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        movements = list(data.all() if hasattr(data, "all") else data)
+        load_gift_products(movements)
+        return super().to_representation(movements)
+
+
 class ReadOnlyMovementSerializer(serializers.ModelSerializer):
     amount = serializers.SerializerMethodField()
     amount_local_currency = serializers.SerializerMethodField()
@@ -409,6 +406,7 @@ class ReadOnlyMovementSerializer(serializers.ModelSerializer):
             "created_at",
         ]
         depth = 1
+        list_serializer_class = ReadOnlyMovementListSerializer
 
     def get_amount(self, obj):
         if obj.purchase is not None:
@@ -450,20 +448,28 @@ class ReadOnlyMovementSerializer(serializers.ModelSerializer):
         elif obj.store_payment is not None:
             return obj.store_payment.store.user.username
 
+    def get_usd_exchange_rate(self):
+        "Looked up once per serialization, shared by every movement in it"
+        if "usd_exchange_rate" not in self.context:
+            exchange_rate = usd_exchange_rate_service.get_usd_exchange_rate()
+            self.context["usd_exchange_rate"] = exchange_rate
+
+        return self.context["usd_exchange_rate"]
+
     def get_gift_info(self, obj):
         gift_movs = Movement.get_gift_types()
         if not obj.movement_type in gift_movs:
             return
 
-        exchange_rate = usd_exchange_rate_service.get_usd_exchange_rate()
+        if not hasattr(obj.purchase, "gift_products"):
+            load_gift_products([obj])
+
+        exchange_rate = self.get_usd_exchange_rate()
         gift_info = {
             "recipient_username": obj.purchase.gift_recipient.username,
             "amount_local_currency": self.get_amount(obj) * exchange_rate,
             "usd_exchange_rate": exchange_rate,
-            "products": obj.purchase.products.filter(
-                store_prices__store=obj.purchase.store,
-                purchasehasproduct__purchase=obj.purchase,
-            ).values("name", "purchasehasproduct__quantity", "store_prices__price"),
+            "products": obj.purchase.gift_products,
             "account": "Beers",
         }
 
@@ -520,3 +526,20 @@ class ReadOnlyMovementSerializer(serializers.ModelSerializer):
             "usd_exchange_rate": usd_exchange_rate,
             "commission_rate": commission_rate,
         }
+
+
+class MovementExportSerializer(ReadOnlyMovementSerializer):
+    "Flat version of the admin movements, one value per column"
+
+    class Meta:
+        model = Movement
+        fields = [
+            "id",
+            "created_at",
+            "movement_type",
+            "grouping_id",
+            "username",
+            "amount",
+            "amount_local_currency",
+            "commission_amount",
+        ]
@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save
+
+from users.models import User
+from stores.models import Store, store_balances_changed
+from payments.models import Movement, StorePayment
+from payments.api.payout_totals import invalidate_payout_totals
+
+
+def invalidate_cached_payout_totals(sender, **kwargs):
+    invalidate_payout_totals()
+    # Invalidate again once committed, a request could have cached the
+    # totals in between
+    transaction.on_commit(invalidate_payout_totals)
+
+
+def invalidate_cached_payout_totals_on_payment(sender, created, **kwargs):
+    if created:
+        invalidate_cached_payout_totals(sender, **kwargs)
+
+
+# Sent when purchases are delivered or settled by a payment
+store_balances_changed.connect(
+    invalidate_cached_payout_totals,
+    sender=Store,
+    dispatch_uid="payout_totals_store_balances_changed",
+)
+post_save.connect(
+    invalidate_cached_payout_totals_on_payment,
+    sender=StorePayment,
+    dispatch_uid="payout_totals_post_save_StorePayment",
+)
+
+
+# Names copied to the movements for the admin search
+MOVEMENT_SEARCH_FIELDS = {User: "username", Store: "name"}
+
+
+def load_movement_search_name(sender, instance, update_fields=None, **kwargs):
+    field = MOVEMENT_SEARCH_FIELDS[sender]
+    instance._movement_search_name = None
+    if instance._state.adding:
+        return
+
+    if update_fields is not None and field not in update_fields:
+        instance._movement_search_name = getattr(instance, field)
+    else:
+        instance._movement_search_name = (
+            sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+        )
+
+
+def update_movement_search_names(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    field = MOVEMENT_SEARCH_FIELDS[sender]
+    if getattr(instance, "_movement_search_name", None) == getattr(instance, field):
+        return
+
+    if sender is User:
+        Movement.objects.update_actor_username(instance)
+    else:
+        Movement.objects.update_store_name(instance)
+
+
+for model in MOVEMENT_SEARCH_FIELDS:
+    pre_save.connect(
+        load_movement_search_name,
+        sender=model,
+        dispatch_uid=f"movement_search_pre_save_{model.__name__}",
+    )
+    post_save.connect(
+        update_movement_search_names,
+        sender=model,
+        dispatch_uid=f"movement_search_post_save_{model.__name__}",
+    )
@@ -7,7 +7,7 @@ from copy import deepcopy
 import stripe
 
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Q, Prefetch
 from django.shortcuts import render
 from django.contrib.sites.shortcuts import get_current_site
 
@@ -18,6 +18,7 @@ from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.parsers import BaseParser
 
 from stores.models import Purchase
+from stores.api.purchase_lines import prefetch_purchase_lines
 
 from payments.models import (
     Funding,
@@ -33,6 +34,7 @@ from payments.serializers import (
     StorePaymentSerializer,
 )
 
+from common.pagination import OptionalKeysetPagination
 from common.permissions import IsAdminOrVerifiedStoreUser, IsVerifiedStoreUser
 from common.payments.services.stripe import stripe_service
 from common.payments.services.paypal import paypal_service
@@ -351,45 +353,46 @@ class ValidateOrderView(APIView):
 
 class MovementsView(viewsets.ReadOnlyModelViewSet):
     serializer_class = MovementSerializer
+    pagination_class = OptionalKeysetPagination
 
     def get_queryset(self):
         user = self.request.user
 
-        user_fundings = Q(funding__user=user)
-
-        is_gift_sent = Q(movement_type=Movement.Type.GIFT_SENT)
-        is_gift_accepted = Q(movement_type=Movement.Type.GIFT_ACCEPTED)
-        is_gift_claimed = Q(movement_type=Movement.Type.GIFT_CLAIMED)
-        is_gift_received = Q(movement_type=Movement.Type.GIFT_RECEIVED)
-        is_other_gift_movement = Q(
-            movement_type__in=[
-                Movement.Type.GIFT_REJECTED,
-                Movement.Type.GIFT_EXPIRED,
-            ]
-        )
-
-        is_sender = Q(purchase__user=user)
-        is_recipient = Q(purchase__gift_recipient=user)
-
-        user_as_gift_sender = (
-            is_gift_sent | is_gift_accepted | is_other_gift_movement
-        ) & is_sender
-        user_as_gift_recipient = (
-            is_gift_claimed | is_other_gift_movement
-        ) & is_recipient
-        main_filter = user_fundings | user_as_gift_sender | user_as_gift_recipient
-
         gift_accepted_received_only = self.request.query_params.get(
             "gift_accepted_received_only", False
         )
         if gift_accepted_received_only:
-            is_pending_gift_received = is_gift_received & Q(
-                purchase__status=Purchase.Status.PENDING
+            pending_gifts_received = Q(
+                owner_user=user,
+                movement_type=Movement.Type.GIFT_RECEIVED,
+                purchase__status=Purchase.Status.PENDING,
+            )
+            gifts_accepted = Q(
+                counterparty_user=user, movement_type=Movement.Type.GIFT_ACCEPTED
             )
-            is_not_gift_delivered = ~Q(
-                purchase__status=Purchase.Status.DELIVERED
+            not_delivered = ~Q(purchase__status=Purchase.Status.DELIVERED)
+            main_filter = (pending_gifts_received | gifts_accepted) & not_delivered
+        else:
+            owned_movements = Q(
+                owner_user=user,
+                movement_type__in=[
+                    Movement.Type.FUNDING,
+                    Movement.Type.GIFT_SENT,
+                    Movement.Type.GIFT_ACCEPTED,
+                    Movement.Type.GIFT_CLAIMED,
+                    Movement.Type.GIFT_REJECTED,
+                    Movement.Type.GIFT_EXPIRED,
+                ],
+            )
+            # Gifts that didn't go through show up for their recipient too
+            failed_gifts_received = Q(
+                counterparty_user=user,
+                movement_type__in=[
+                    Movement.Type.GIFT_REJECTED,
+                    Movement.Type.GIFT_EXPIRED,
+                ],
             )
-            main_filter = (is_pending_gift_received | is_gift_accepted) & is_recipient &  is_not_gift_delivered
+            main_filter = owned_movements | failed_gifts_received
 
         return Movement.objects.filter(main_filter).order_by("-created_at")
 
@@ -525,7 +528,12 @@ class StorePaymentViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = StorePaymentSerializer
 
     def get_queryset(self):
-        queryset = self.queryset
+        purchases = prefetch_purchase_lines(
+            Purchase.objects.select_related("gift_recipient__profile")
+        )
+        queryset = self.queryset.select_related("store").prefetch_related(
+            Prefetch("purchases", queryset=purchases)
+        )
         store_id = get_store_id_from_request(self.request)
         if store_id is not None:
             queryset = queryset.filter(store_id=store_id)
@@ -0,0 +1,193 @@
+import logging
+import threading
+from collections import namedtuple
+from time import monotonic
+from uuid import uuid4
+
+import numpy as np
+from redis.exceptions import RedisError
+
+from django.core.cache import cache
+
+from stores.models import Store, ScheduleDay, StoreHasProduct
+from stores.api.schedules import caracas_now
+
+CATALOG_VERSION_KEY = "stores:catalog:version"
+# Seconds a snapshot is kept while the cache is unavailable
+CATALOG_UNVERSIONED_TIMEOUT = 60
+
+logger = logging.getLogger("stores_catalog")
+
+ScheduleRecord = namedtuple(
+    "ScheduleRecord", ["day", "open_hour", "close_hour", "closed"]
+)
+
+
+def get_photo_url(user):
+    if user.photo is None:
+        return
+
+    try:
+        return user.photo.url
+    except Exception:
+        return
+
+
+class StoreRecord:
+    "Snapshot of the data needed to list a verified store"
+
+    __slots__ = (
+        "id",
+        "name",
+        "location_id",
+        "latitude",
+        "longitude",
+        "rating",
+        "reviews_count",
+        "photo",
+        "schedule",
+        "product_ids",
+    )
+
+    def __init__(self, store, schedule, product_ids):
+        self.id = store.id
+        self.name = store.name
+        self.location_id = store.location_id
+        self.latitude = float(store.location.latitude)
+        self.longitude = float(store.location.longitude)
+        self.rating = store.rating
+        self.reviews_count = store.reviews_count
+        self.photo = get_photo_url(store.user)
+        self.schedule = schedule
+        self.product_ids = product_ids
+
+    @property
+    def schedule_today(self):
+        return self.schedule_on(caracas_now())
+
+    def schedule_on(self, now):
+        "The store's schedule for the day of `now`"
+        if not self.schedule:
+            return
+
+        return self.schedule.get(now.weekday())
+
+
+class StoreCatalog:
+    """
+    In-process snapshot of every verified store with a location. Records are
+    kept alongside a NumPy array with their coordinates, in the same order,
+    so spatial searches don't need to hit the database.
+    """
+
+    def __init__(self, version, records):
+        self.version = version
+        self.built_at = monotonic()
+        self.records = records
+        self.coordinates = np.array(
+            [(record.latitude, record.longitude) for record in records],
+            dtype=np.float64,
+        ).reshape(-1, 2)
+        self.positions = {
+            record.id: position for position, record in enumerate(records)
+        }
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, store_id):
+        position = self.positions.get(store_id)
+        if position is None:
+            return
+
+        return self.records[position]
+
+    @classmethod
+    def build(cls, version):
+        stores = (
+            Store.objects.filter(verified=True, location__isnull=False)
+            .select_related("location", "user")
+            .order_by("id")
+        )
+
+        schedules = {}
+        schedule_days = ScheduleDay.objects.filter(store__verified=True).values_list(
+            "store", "day", "open_hour", "close_hour", "closed"
+        )
+        for store_id, *schedule_day in schedule_days:
+            schedule_record = ScheduleRecord(*schedule_day)
+            schedules.setdefault(store_id, {})[schedule_record.day] = schedule_record
+
+        products = {}
+        store_products = StoreHasProduct.objects.filter(
+            store__verified=True
+        ).values_list("store", "product")
+        for store_id, product_id in store_products:
+            products.setdefault(store_id, set()).add(product_id)
+
+        records = [
+            StoreRecord(store, schedules.get(store.id), products.get(store.id, set()))
+            for store in stores
+        ]
+        return cls(version, records)
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog_version():
+    try:
+        version = cache.get(CATALOG_VERSION_KEY)
+        if version is None:
+            cache.add(CATALOG_VERSION_KEY, uuid4().hex, timeout=None)
+            version = cache.get(CATALOG_VERSION_KEY)
+    except RedisError as e:
+        logger.error(f"Error reading the store catalog version: {str(e)}")
+        return
+
+    return version
+
+
+def is_outdated(catalog, version):
+    if catalog is None or catalog.version != version:
+        return True
+
+    # Without the shared version there's no way to know when to rebuild
+    age = monotonic() - catalog.built_at
+    return version is None and age > CATALOG_UNVERSIONED_TIMEOUT
+
+
+def get_catalog():
+    """
+    Returns this worker's catalog snapshot, rebuilding it first when the
+    shared version stored in the cache has changed since it was built.
+    While the cache is unavailable the snapshot is rebuilt periodically.
+    """
+    global _catalog
+
+    # Read the version before building, so a write that happens while
+    # building leaves the snapshot outdated instead of mislabeled.
+    version = get_catalog_version()
+
+    catalog = _catalog
+    if is_outdated(catalog, version):
+        with _catalog_lock:
+            if is_outdated(_catalog, version):
+                _catalog = StoreCatalog.build(version)
+
+            catalog = _catalog
+
+    return catalog
+
+
+def invalidate_catalog():
+    "Makes every worker rebuild its catalog snapshot on next use"
+    global _catalog
+
+    try:
+        cache.set(CATALOG_VERSION_KEY, uuid4().hex, timeout=None)
+    except RedisError as e:
+        logger.error(f"Error invalidating the store catalog: {str(e)}")
+        # At least this worker won't serve the outdated snapshot
+        _catalog = None
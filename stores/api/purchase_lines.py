@@ -0,0 +1,57 @@
+from django.db.models import Prefetch, prefetch_related_objects
+
+from stores.models import PurchaseHasProduct, PurchaseHasPromotion
+
+
+def product_lines_prefetch(prefix=""):
+    "Prefetches the product lines of purchases into `product_lines`"
+    return Prefetch(
+        f"{prefix}purchasehasproduct_set",
+        queryset=PurchaseHasProduct.objects.select_related("product").order_by(
+            "product__created_at", "created_at"
+        ),
+        to_attr="product_lines",
+    )
+
+
+def promotion_lines_prefetch(prefix=""):
+    "Prefetches the promotion lines of purchases into `promotion_lines`"
+    return Prefetch(
+        f"{prefix}purchasehaspromotion_set",
+        queryset=PurchaseHasPromotion.objects.select_related("promotion").order_by(
+            "promotion__created_at", "created_at"
+        ),
+        to_attr="promotion_lines",
+    )
+
+
+def prefetch_purchase_lines(queryset, prefix=""):
+    "Prefetches the product and promotion lines of the purchases in `queryset`"
+    return queryset.prefetch_related(
+        product_lines_prefetch(prefix), promotion_lines_prefetch(prefix)
+    )
+
+
+def load_purchase_lines(purchases):
+    """
+    Sets `product_lines` and `promotion_lines` on the purchases that don't
+    have them yet, with one query for each kind of line whatever the number
+    of purchases.
+    """
+    purchases = [
+        purchase for purchase in purchases if not hasattr(purchase, "product_lines")
+    ]
+    if purchases:
+        prefetch_related_objects(
+            purchases, product_lines_prefetch(), promotion_lines_prefetch()
+        )
+
+
+def get_product_lines(purchase):
+    load_purchase_lines([purchase])
+    return purchase.product_lines
+
+
+def get_promotion_lines(purchase):
+    load_purchase_lines([purchase])
+    return purchase.promotion_lines
@@ -0,0 +1,64 @@
+from datetime import datetime, time
+
+import pytz
+
+from django.db.models import Q, F, Prefetch
+
+from stores.models import ScheduleDay
+
+CARACAS_TIMEZONE = pytz.timezone("America/Caracas")
+
+
+def caracas_now():
+    return datetime.now(tz=CARACAS_TIMEZONE)
+
+
+def get_open_now(query_params):
+    "Reads the `open_now` query parameter"
+    return query_params.get("open_now", "false").lower() == "true"
+
+
+def is_open(schedule_day, now):
+    """
+    Tells if a store is open at `now` according to its schedule for that day,
+    comparing hours and minutes. A closing hour earlier than the opening hour
+    means the store closes after midnight.
+    """
+    if schedule_day is None or schedule_day.closed:
+        return False
+
+    current_time = time(now.hour, now.minute)
+    open_hour = schedule_day.open_hour.replace(second=0, microsecond=0)
+    close_hour = schedule_day.close_hour.replace(second=0, microsecond=0)
+    if close_hour < open_hour:
+        return open_hour <= current_time
+
+    return open_hour <= current_time <= close_hour
+
+
+def open_now_filter(now, prefix=""):
+    "Filter matching the stores that are open at `now`, see `is_open`"
+    current_time = time(now.hour, now.minute)
+    open_schedules = ScheduleDay.objects.filter(
+        Q(close_hour__gte=current_time) | Q(close_hour__lt=F("open_hour")),
+        day=now.weekday(),
+        closed=False,
+        open_hour__lte=current_time,
+    )
+    return Q(**{f"{prefix}pk__in": open_schedules.values("store")})
+
+
+def schedule_today_prefetch(now, prefix=""):
+    """
+    Prefetches the schedule for the day of `now` of every store, which
+    `Store.schedule_today` reads instead of querying once per store.
+    """
+    return Prefetch(
+        f"{prefix}scheduleday_set",
+        queryset=ScheduleDay.objects.filter(day=now.weekday()),
+        to_attr="prefetched_schedule_today",
+    )
+
+
+def prefetch_schedule_today(queryset, now, prefix=""):
+    return queryset.prefetch_related(schedule_today_prefetch(now, prefix))
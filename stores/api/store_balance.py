@@ -1,10 +1,17 @@
 from datetime import datetime, timezone
 from decimal import Decimal
 
+from django.db import transaction
 from django.db.models import Q, F, Sum, Value, Case, When, Prefetch
 
 
-from stores.models import Store, Purchase
+from stores.models import (
+    Store,
+    Purchase,
+    UNPAID_PURCHASE_FIELDS,
+    is_unpaid_delivery,
+    update_store_unpaid_amount,
+)
 
 
 def get_stores_and_unpaid_purchases(stores):
@@ -57,3 +64,46 @@ def calculate_store_balance(store_id, queryset=None):
 
     balance_by_store = stores_with_delivered.annotate(balance=F("unpaid_delivered"))
     return balance_by_store
+
+
+def get_store_balances(queryset=None):
+    """
+    Annotates the stores with their unpaid balance read from the running
+    `unpaid_amount` ledger, unlike `calculate_store_balance` no purchase is
+    aggregated.
+    """
+    if queryset is None:
+        queryset = Store.objects.all()
+
+    return queryset.annotate(
+        store=F("pk"), balance=F("unpaid_amount") * (1 - F("commission_percentage"))
+    )
+
+
+def get_unpaid_purchase_ids(store_id):
+    "Ids of the delivered purchases of the store that weren't paid yet"
+    unpaid_purchases = Purchase.objects.filter(
+        store=store_id, status=Purchase.Status.DELIVERED, store_payment=None
+    )
+    return list(unpaid_purchases.values_list("id", flat=True))
+
+
+def settle_purchases(store_payment, purchases):
+    """
+    Marks the purchases as paid with `store_payment` and takes them off the
+    unpaid amount of their stores, in the same transaction.
+    """
+    with transaction.atomic():
+        locked_purchases = purchases.select_for_update().values(
+            "id", *UNPAID_PURCHASE_FIELDS
+        )
+        settled_by_store = {}
+        for purchase in locked_purchases:
+            if is_unpaid_delivery(purchase):
+                store_id = purchase["store_id"]
+                settled_amount = settled_by_store.get(store_id, Decimal(0))
+                settled_by_store[store_id] = settled_amount + purchase["amount"]
+
+        purchases.update(store_payment=store_payment)
+        for store_id, settled_amount in settled_by_store.items():
+            update_store_unpaid_amount(store_id, -settled_amount)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from stores.models import Store, StoreReview, recompute_store_ratings
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the stored rating totals of the stores from their reviews, "
+        "fixing any drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--stores", nargs="+", type=int, help="Only recompute these store ids"
+        )
+
+    def handle(self, *args, **options):
+        stores = Store.objects.all()
+        if options["stores"]:
+            stores = stores.filter(pk__in=options["stores"])
+
+        updated = recompute_store_ratings(stores, StoreReview.objects.all())
+        self.stdout.write(f"Recomputed the rating of {updated} stores")
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from stores.models import (
+    Store,
+    Purchase,
+    recompute_store_unpaid_amounts,
+    store_balances_changed,
+    unpaid_amount_subquery,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the unpaid amount of every store from its purchases and "
+        "reports the stores whose running balance drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Overwrite the drifted balances with the recomputed ones",
+        )
+
+    def handle(self, *args, **options):
+        drifted = (
+            Store.objects.annotate(
+                expected_unpaid_amount=unpaid_amount_subquery(Purchase.objects.all())
+            )
+            .exclude(unpaid_amount=F("expected_unpaid_amount"))
+            .values_list("id", "name", "unpaid_amount", "expected_unpaid_amount")
+        )
+        drifted = list(drifted)
+        for store_id, name, unpaid_amount, expected_unpaid_amount in drifted:
+            self.stdout.write(
+                f"Store {store_id} ({name}): recorded {unpaid_amount}, "
+                f"expected {expected_unpaid_amount}, "
+                f"drift {unpaid_amount - expected_unpaid_amount}"
+            )
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("No drift found"))
+            return
+
+        if options["fix"]:
+            store_ids = [store[0] for store in drifted]
+            stores = Store.objects.filter(pk__in=store_ids)
+            updated = recompute_store_unpaid_amounts(stores, Purchase.objects.all())
+            store_balances_changed.send(sender=Store, store_ids=store_ids)
+            self.stdout.write(self.style.SUCCESS(f"Fixed {updated} stores"))
+        else:
+            self.stdout.write(
+                self.style.WARNING(f"{len(drifted)} stores drifted, use --fix")
+            )
@@ -0,0 +1,47 @@
+# Generated by Django 4.1.4 on 2026-10-16 12:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_rating_totals(apps, schema_editor):
+    Store = apps.get_model("stores", "Store")
+    StoreReview = apps.get_model("stores", "StoreReview")
+
+    store_reviews = (
+        StoreReview.objects.filter(store=OuterRef("pk")).order_by().values("store")
+    )
+    Store.objects.update(
+        rating_sum=Coalesce(
+            Subquery(store_reviews.annotate(total=Sum("rating")).values("total")), 0
+        ),
+        rating_count=Coalesce(
+            Subquery(store_reviews.annotate(total=Count("pk")).values("total")), 0
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stores", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="store",
+            name="rating_sum",
+            field=models.IntegerField(
+                default=0, help_text="Sum of the ratings given in the store's reviews"
+            ),
+        ),
+        migrations.AddField(
+            model_name="store",
+            name="rating_count",
+            field=models.IntegerField(
+                default=0, help_text="Number of reviews the store has received"
+            ),
+        ),
+        migrations.RunPython(populate_rating_totals, migrations.RunPython.noop),
+    ]
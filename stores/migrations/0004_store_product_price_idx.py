@@ -0,0 +1,19 @@
+# Generated by Django 4.1.4 on 2026-10-16 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stores", "0003_store_rating_totals"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="storehasproduct",
+            index=models.Index(
+                fields=["product", "price"], name="store_product_price_idx"
+            ),
+        ),
+    ]
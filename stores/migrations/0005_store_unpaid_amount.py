@@ -0,0 +1,48 @@
+# Generated by Django 4.1.4 on 2026-10-16 14:00
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_unpaid_amounts(apps, schema_editor):
+    Store = apps.get_model("stores", "Store")
+    Purchase = apps.get_model("stores", "Purchase")
+
+    unpaid_totals = (
+        Purchase.objects.filter(
+            store=OuterRef("pk"), status="DELIVERED", store_payment=None
+        )
+        .order_by()
+        .values("store")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    Store.objects.update(
+        unpaid_amount=Coalesce(
+            Subquery(unpaid_totals),
+            Value(0),
+            output_field=models.DecimalField(max_digits=19, decimal_places=2),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stores", "0004_store_product_price_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="store",
+            name="unpaid_amount",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                help_text="Total amount of the store's delivered purchases not paid yet",
+                max_digits=19,
+            ),
+        ),
+        migrations.RunPython(populate_unpaid_amounts, migrations.RunPython.noop),
+    ]
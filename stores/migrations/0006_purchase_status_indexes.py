@@ -0,0 +1,20 @@
+# Generated by Django 4.1.4 on 2026-10-16 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stores", "0005_store_unpaid_amount"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="purchase",
+            index=models.Index(
+                fields=["status", "gift_expiration_date"],
+                name="purchase_status_expiration_idx",
+            ),
+        ),
+    ]
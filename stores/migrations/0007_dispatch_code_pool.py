@@ -0,0 +1,73 @@
+# Generated by Django 4.1.4 on 2026-10-16 20:00
+
+import random
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_dispatch_code_pool(apps, schema_editor):
+    """
+    Adds every unused 5 digit code to the pool in random order, then gives
+    new codes to the stores sharing one so the column can be made unique.
+    """
+    Store = apps.get_model("stores", "Store")
+    DispatchCode = apps.get_model("stores", "DispatchCode")
+
+    used_codes = set(
+        Store.objects.exclude(dispatch_code=None).values_list(
+            "dispatch_code", flat=True
+        )
+    )
+    codes = [f"{number:05d}" for number in range(100_000)]
+    codes = [code for code in codes if code not in used_codes]
+    random.shuffle(codes)
+    DispatchCode.objects.bulk_create(
+        [
+            DispatchCode(code=code, position=position)
+            for position, code in enumerate(codes)
+        ],
+        batch_size=5000,
+    )
+
+    duplicated_codes = (
+        Store.objects.exclude(dispatch_code=None)
+        .values("dispatch_code")
+        .annotate(stores=Count("id"))
+        .filter(stores__gt=1)
+        .values_list("dispatch_code", flat=True)
+    )
+    for duplicated_code in list(duplicated_codes):
+        stores = Store.objects.filter(dispatch_code=duplicated_code).order_by("id")
+        for store in stores[1:]:
+            dispatch_code = DispatchCode.objects.order_by("position").first()
+            dispatch_code.delete()
+            store.dispatch_code = dispatch_code.code
+            store.save(update_fields=["dispatch_code"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stores", "0006_purchase_status_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DispatchCode",
+            fields=[
+                (
+                    "code",
+                    models.CharField(max_length=5, primary_key=True, serialize=False),
+                ),
+                (
+                    "position",
+                    models.IntegerField(
+                        help_text="Random position, codes are handed out in this order",
+                        unique=True,
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(fill_dispatch_code_pool, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.4 on 2026-10-16 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stores", "0007_dispatch_code_pool"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="store",
+            name="dispatch_code",
+            field=models.CharField(
+                help_text="Code used to verify purchase dispatchs",
+                max_length=5,
+                null=True,
+                unique=True,
+            ),
+        ),
+    ]
@@ -1,27 +1,71 @@
 import pytz
 from datetime import datetime, timezone, time, timedelta
 from uuid import uuid4
-from shortuuid import ShortUUID
 
-from django.db import models
+from django.db import models, transaction, connection
+from django.dispatch import Signal
+from django.db.models.functions import Coalesce
 from django.core.validators import MaxValueValidator, MinValueValidator
 
 from phonenumber_field.modelfields import PhoneNumberField
 
 from common.models import TimeStampedModel
 
-shortuuid = ShortUUID(alphabet="0123456789")
+
+class DispatchCodesExhausted(Exception):
+    "The pool of unused dispatch codes is empty"
 
 
 def generate_dispatch_code():
-    code = shortuuid.uuid()[:5]
-    while Store.objects.filter(dispatch_code=code).exists():
-        code = shortuuid.uuid()[:5]
+    """
+    Claims the next code of the pool of unused dispatch codes. On Postgres
+    the code is taken in a single query, skipping the codes other
+    transactions are claiming instead of waiting for them. Raises
+    DispatchCodesExhausted when there are no codes left.
+    """
+    if connection.vendor == "postgresql":
+        table = connection.ops.quote_name(DispatchCode._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                DELETE FROM {table} WHERE code = (
+                    SELECT code FROM {table}
+                    ORDER BY position LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING code
+                """
+            )
+            row = cursor.fetchone()
+
+        code = row[0] if row is not None else None
+    else:
+        with transaction.atomic():
+            code = (
+                DispatchCode.objects.select_for_update()
+                .order_by("position")
+                .values_list("code", flat=True)
+                .first()
+            )
+            if code is not None:
+                DispatchCode.objects.filter(pk=code).delete()
+
+    if code is None:
+        raise DispatchCodesExhausted("There are no dispatch codes left")
 
     return code
 
 
 # Create your models here.
+class DispatchCode(models.Model):
+    """Dispatch code not given to any store yet"""
+
+    code = models.CharField(max_length=5, primary_key=True)
+    position = models.IntegerField(
+        unique=True, help_text="Random position, codes are handed out in this order"
+    )
+
+
 class Product(TimeStampedModel):
     name = models.TextField(help_text="The product's name")
     description = models.TextField(help_text="The product's description", null=True)
@@ -67,11 +111,29 @@ class Store(TimeStampedModel):
     )
     products = models.ManyToManyField(Product, through="StoreHasProduct")
     dispatch_code = models.CharField(
-        max_length=5, null=True, help_text="Code used to verify purchase dispatchs"
+        max_length=5,
+        null=True,
+        unique=True,
+        help_text="Code used to verify purchase dispatchs",
+    )
+    rating_sum = models.IntegerField(
+        default=0, help_text="Sum of the ratings given in the store's reviews"
+    )
+    rating_count = models.IntegerField(
+        default=0, help_text="Number of reviews the store has received"
+    )
+    unpaid_amount = models.DecimalField(
+        max_digits=19,
+        decimal_places=2,
+        default=0,
+        help_text="Total amount of the store's delivered purchases not paid yet",
     )
 
     @property
     def schedule_today(self):
+        if hasattr(self, "prefetched_schedule_today"):
+            return next(iter(self.prefetched_schedule_today), None)
+
         if not self.scheduleday_set.exists():
             return
 
@@ -82,13 +144,19 @@ class Store(TimeStampedModel):
     @property
     def rating(self):
         "The store's reputation score, a number between 0.0 and 5.0"
-        reviews: models.QuerySet = self.reviews.all()
-        reviews_avg = reviews.aggregate(models.Avg("rating"))
-        return reviews_avg["rating__avg"]
+        if not self.rating_count:
+            return None
+
+        return self.rating_sum / self.rating_count
 
     @property
     def reviews_count(self):
-        return self.reviews.count()
+        return self.rating_count
+
+    @property
+    def unpaid_balance(self):
+        "What Beers owes the store for its delivered purchases, minus commission"
+        return self.unpaid_amount * (1 - self.commission_percentage)
 
 
 class StoreHasProduct(TimeStampedModel):
@@ -111,6 +179,9 @@ class StoreHasProduct(TimeStampedModel):
                 fields=("store", "product"), name="store_product_unique_together"
             )
         ]
+        indexes = [
+            models.Index(fields=["product", "price"], name="store_product_price_idx")
+        ]
 
 
 class UserHasFavoriteStore(TimeStampedModel):
@@ -213,6 +284,14 @@ class Purchase(TimeStampedModel):
         help_text="Commission percentage associated with the store at the time of payment",
     )
 
+    class Meta(TimeStampedModel.Meta):
+        indexes = [
+            models.Index(
+                fields=["status", "gift_expiration_date"],
+                name="purchase_status_expiration_idx",
+            ),
+        ]
+
     @property
     def products_quantity(self):
         quantity = self.purchasehasproduct_set.aggregate(models.Sum("quantity"))[
@@ -229,7 +308,7 @@ class Purchase(TimeStampedModel):
 
     @property
     def gift_has_expired(self):
-        if not self.gift_recipient:
+        if self.gift_recipient_id is None:
             return False
 
         delivered_status = self.Status.DELIVERED.value
@@ -278,6 +357,84 @@ class Purchase(TimeStampedModel):
     def reference_number(self):
         return str(self.id).zfill(6)
 
+    def save(self, *args, **kwargs):
+        """
+        Saves the purchase and keeps the unpaid amount of its store up to date,
+        both are written in the same transaction.
+        """
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = (
+                    Purchase.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values(*UNPAID_PURCHASE_FIELDS)
+                    .first()
+                )
+
+            super().save(*args, **kwargs)
+
+            current = Purchase.objects.values(*UNPAID_PURCHASE_FIELDS).get(pk=self.pk)
+            if previous == current:
+                return
+
+            if previous is not None and is_unpaid_delivery(previous):
+                update_store_unpaid_amount(previous["store_id"], -previous["amount"])
+
+            if is_unpaid_delivery(current):
+                update_store_unpaid_amount(current["store_id"], current["amount"])
+
+
+UNPAID_PURCHASE_FIELDS = ("status", "amount", "store_id", "store_payment_id")
+
+
+def is_unpaid_delivery(purchase_values):
+    "Tells if a purchase counts towards the unpaid amount of its store"
+    return (
+        purchase_values["status"] == Purchase.Status.DELIVERED
+        and purchase_values["store_payment_id"] is None
+        and purchase_values["store_id"] is not None
+    )
+
+
+# Sent with `store_ids` after the unpaid amount of those stores changes
+store_balances_changed = Signal()
+
+
+def update_store_unpaid_amount(store_id, amount_delta):
+    "Atomically adds to the unpaid amount of a store"
+    Store.objects.filter(pk=store_id).update(
+        unpaid_amount=models.F("unpaid_amount") + amount_delta
+    )
+    store_balances_changed.send(sender=Store, store_ids=[store_id])
+
+
+def recompute_store_unpaid_amounts(stores, purchases):
+    """
+    Recomputes the unpaid amount of every store in `stores` from `purchases`
+    in a single UPDATE, returns the number of stores updated.
+    """
+    return stores.update(unpaid_amount=unpaid_amount_subquery(purchases))
+
+
+def unpaid_amount_subquery(purchases):
+    "The unpaid amount of the store in the outer query, computed from `purchases`"
+    unpaid_purchases = purchases.filter(
+        store=models.OuterRef("pk"),
+        status=Purchase.Status.DELIVERED,
+        store_payment=None,
+    ).order_by()
+    unpaid_total = (
+        unpaid_purchases.values("store")
+        .annotate(total=models.Sum("amount"))
+        .values("total")
+    )
+    return Coalesce(
+        models.Subquery(unpaid_total),
+        models.Value(0),
+        output_field=models.DecimalField(max_digits=19, decimal_places=2),
+    )
+
 
 class PurchaseHasProduct(TimeStampedModel):
     purchase = models.ForeignKey(Purchase, on_delete=models.CASCADE)
@@ -303,6 +460,65 @@ class StoreReview(TimeStampedModel):
     class Meta:
         unique_together = ["store", "user"]
 
+    def save(self, *args, **kwargs):
+        """
+        Saves the review and keeps the rating totals of its store up to date,
+        both are written in the same transaction.
+        """
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = (
+                    StoreReview.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values("store_id", "rating")
+                    .first()
+                )
+
+            super().save(*args, **kwargs)
+
+            # Read back what was written, `update_fields` may have left out
+            # the rating or the store
+            current = StoreReview.objects.values("store_id", "rating").get(pk=self.pk)
+            if previous == current:
+                return
+
+            if previous is not None:
+                update_store_rating(previous["store_id"], -previous["rating"], -1)
+
+            update_store_rating(current["store_id"], current["rating"], 1)
+
+
+def update_store_rating(store_id, rating_delta, count_delta):
+    "Atomically adds to the rating totals of a store"
+    Store.objects.filter(pk=store_id).update(
+        rating_sum=models.F("rating_sum") + rating_delta,
+        rating_count=models.F("rating_count") + count_delta,
+    )
+
+
+def recompute_store_ratings(stores, reviews):
+    """
+    Recomputes the rating totals of every store in `stores` from `reviews` in a
+    single UPDATE, returns the number of stores updated.
+    """
+    store_reviews = reviews.filter(store=models.OuterRef("pk")).order_by()
+    store_reviews = store_reviews.values("store")
+    return stores.update(
+        rating_sum=Coalesce(
+            models.Subquery(
+                store_reviews.annotate(total=models.Sum("rating")).values("total")
+            ),
+            0,
+        ),
+        rating_count=Coalesce(
+            models.Subquery(
+                store_reviews.annotate(total=models.Count("pk")).values("total")
+            ),
+            0,
+        ),
+    )
+
 
 class ScheduleDay(models.Model):
     class WeekDay(models.IntegerChoices):
@@ -1,7 +1,6 @@
 import os
-import pytz
 import logging
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from decimal import Decimal
 
 from django.db import transaction
@@ -9,7 +8,8 @@ from django.db.models import Prefetch
 from django.conf import settings
 from django.core.mail import send_mail
 
-from rest_framework import serializers
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
 from rest_framework.validators import UniqueTogetherValidator
 from firebase_admin.messaging import Message, Notification as FCMNotification
 from fcm_django.models import FCMDevice
@@ -33,8 +33,12 @@ from stores.models import (
     StoreReview,
     get_gift_expiration_date,
     generate_dispatch_code,
+    DispatchCodesExhausted,
 )
 
+from stores.api.schedules import caracas_now, is_open
+from stores.api.purchase_lines import load_purchase_lines
+
 from notifications.models import Notification, PUSH_NOTIFICATION_LABEL
 from notifications.serializers import NotificationSerializer
 
@@ -42,6 +46,12 @@ logger = logging.getLogger("stores_serializers")
 logger.setLevel(os.getenv("LOG_LEVEL", logging.INFO))
 
 
+class DispatchCodesUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Stores cannot be registered right now, try again later"
+    default_code = "dispatch_codes_unavailable"
+
+
 class ProductSerializer(DynamicDepthModelSerializer, DynamicFieldsModelSerializer):
     class Meta:
         model = Product
@@ -55,6 +65,25 @@ class ScheduleDaySerializer(DynamicFieldsModelSerializer):
         list_serializer_class = UpdateListSerializer
 
 
+def serialize_schedule_today(schedule_day, now=None):
+    """
+    Serializes today's schedule of a store, `closed` is also True when the
+    current time in Caracas is outside of the opening hours.
+    """
+    if not schedule_day:
+        return
+
+    if now is None:
+        now = caracas_now()
+
+    return {
+        "day": schedule_day.day,
+        "open_hour": schedule_day.open_hour.isoformat(),
+        "close_hour": schedule_day.close_hour.isoformat(),
+        "closed": not is_open(schedule_day, now),
+    }
+
+
 class StoreSerializer(DynamicFieldsModelSerializer):
     schedule_today = serializers.SerializerMethodField()
     location_info = serializers.SerializerMethodField()
@@ -96,43 +125,7 @@ class StoreSerializer(DynamicFieldsModelSerializer):
             return
 
     def get_schedule_today(self, obj):
-        if not obj.schedule_today:
-            return
-
-        schedule_today = ScheduleDaySerializer(
-            obj.schedule_today, fields=("day", "open_hour", "close_hour", "closed")
-        )
-
-        open_hour = (
-            datetime.now()
-            .astimezone(pytz.timezone("America/Caracas"))
-            .replace(
-                hour=int(schedule_today.data["open_hour"].split(":")[0]),
-                minute=int(schedule_today.data["open_hour"].split(":")[1]),
-            )
-        )
-        close_hour = (
-            datetime.now()
-            .astimezone(pytz.timezone("America/Caracas"))
-            .replace(
-                hour=int(schedule_today.data["close_hour"].split(":")[0]),
-                minute=int(schedule_today.data["close_hour"].split(":")[1]),
-            )
-        )
-
-        if close_hour < open_hour:
-            close_hour = close_hour + timedelta(days=1)
-
-        is_closed = not (
-            open_hour
-            <= datetime.now().astimezone(pytz.timezone("America/Caracas"))
-            <= close_hour
-        )
-
-        return {
-            **schedule_today.data,
-            "closed": is_closed or schedule_today.data["closed"],
-        }
+        return serialize_schedule_today(obj.schedule_today, self.context.get("now"))
 
     def get_location_info(self, obj):
         location_info = {
@@ -141,16 +134,15 @@ class StoreSerializer(DynamicFieldsModelSerializer):
         }
         return location_info
 
-    def validate(self, data):
-        if self.instance:
-            # Update
-            return data
-
-        data["dispatch_code"] = generate_dispatch_code()
-        return data
-
     def create(self, validated_data):
         with transaction.atomic():
+            # Claimed along with the insert, so a failed create gives it back
+            try:
+                validated_data["dispatch_code"] = generate_dispatch_code()
+            except DispatchCodesExhausted:
+                logger.error("The pool of store dispatch codes is empty")
+                raise DispatchCodesUnavailable()
+
             store = super().create(validated_data)
             schedule_data = [{"store": store.id, "day": i} for i in range(7)]
             schedule_serializer = ScheduleDaySerializer(data=schedule_data, many=True)
@@ -361,6 +353,15 @@ class PurchaseHasPromotionSerializer(serializers.ModelSerializer):
         fields = ["id", "purchase", "promotion", "quantity", "created_at", "updated_at"]
 
 
+class PurchaseLinesListSerializer(serializers.ListSerializer):
+    "Loads the product and promotion lines of all the purchases at once"
+
+    def to_representation(self, data):
+        purchases = list(data.all() if hasattr(data, "all") else data)
+        load_purchase_lines(purchases)
+        return super().to_representation(purchases)
+
+
 class PurchaseNotificationHelper:
     def __init__(self, purchase, products, promotions):
         self.purchase = purchase
@@ -477,21 +478,11 @@ class PurchaseSerializerHelper:
         table_serializer.save()
 
     def __create_gift_movements(self, movement_types):
-        from payments.models import Movement
-        from payments.serializers import MovementSerializer
+        from payments.api.movements import MovementWriter
 
-        grouping_id = Movement.objects.get_next_grouping_id()
-        movements_data = [
-            {
-                "movement_type": mov_type,
-                "purchase": self.purchase.id,
-                "grouping_id": grouping_id,
-            }
-            for mov_type in movement_types
-        ]
-        movement_serializer = MovementSerializer(data=movements_data, many=True)
-        movement_serializer.is_valid(raise_exception=True)
-        movement_serializer.save()
+        movement_writer = MovementWriter()
+        movement_writer.add_group(movement_types, purchase=self.purchase)
+        movement_writer.save()
 
     def create_initial_movements(self):
         from payments.models import Movement
@@ -0,0 +1,172 @@
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete
+
+from locations.models import Location
+from users.models import User
+from payments.models import StorePayment
+from stores.models import (
+    Store,
+    ScheduleDay,
+    StoreReview,
+    StoreHasProduct,
+    Purchase,
+    update_store_rating,
+    update_store_unpaid_amount,
+    is_unpaid_delivery,
+)
+from stores.api.catalog import invalidate_catalog
+
+
+def invalidate_store_catalog(sender, **kwargs):
+    invalidate_catalog()
+    # Invalidate again once the data is visible to other workers, otherwise
+    # they could rebuild their snapshot from the uncommitted state.
+    transaction.on_commit(invalidate_catalog)
+
+
+# Fields the store catalog copies from each model, saving any other field
+# keeps the catalog up to date
+CATALOG_FIELDS = {
+    Store: ("name", "location", "user", "verified", "rating_sum", "rating_count"),
+    ScheduleDay: ("store", "day", "open_hour", "close_hour", "closed"),
+    StoreReview: ("store", "rating"),
+    StoreHasProduct: ("store", "product"),
+    Location: ("latitude", "longitude"),
+    User: ("photo",),
+}
+
+
+def get_catalog_values(sender, instance):
+    return tuple(
+        getattr(instance, sender._meta.get_field(field).attname)
+        for field in CATALOG_FIELDS[sender]
+    )
+
+
+def load_catalog_values(sender, instance, update_fields=None, **kwargs):
+    fields = CATALOG_FIELDS[sender]
+    if instance._state.adding:
+        instance._catalog_values = None
+    elif update_fields is not None and not set(update_fields) & set(fields):
+        instance._catalog_values = get_catalog_values(sender, instance)
+    else:
+        instance._catalog_values = (
+            sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+        )
+
+
+def catalog_values_changed(sender, instance):
+    previous = getattr(instance, "_catalog_values", None)
+    return previous is None or previous != get_catalog_values(sender, instance)
+
+
+def invalidate_store_catalog_on_change(sender, instance, **kwargs):
+    if catalog_values_changed(sender, instance):
+        invalidate_store_catalog(sender, **kwargs)
+
+
+def invalidate_store_catalog_on_location_change(sender, instance, **kwargs):
+    if catalog_values_changed(sender, instance) and instance.store_set.exists():
+        invalidate_store_catalog(sender, **kwargs)
+
+
+def invalidate_store_catalog_on_photo_change(sender, instance, **kwargs):
+    if not catalog_values_changed(sender, instance):
+        return
+
+    if Store.objects.filter(user=instance).exists():
+        invalidate_store_catalog(sender, **kwargs)
+
+
+def mark_store_location_delete(sender, instance, **kwargs):
+    # Once deleted the location's stores are gone too, so check beforehand
+    instance._used_by_stores = instance.store_set.exists()
+
+
+def invalidate_store_catalog_on_location_delete(sender, instance, **kwargs):
+    if getattr(instance, "_used_by_stores", True):
+        invalidate_store_catalog(sender, **kwargs)
+
+
+for model in CATALOG_FIELDS:
+    pre_save.connect(
+        load_catalog_values,
+        sender=model,
+        dispatch_uid=f"store_catalog_pre_save_{model.__name__}",
+    )
+
+for model in (Store, ScheduleDay, StoreReview, StoreHasProduct):
+    post_save.connect(
+        invalidate_store_catalog_on_change,
+        sender=model,
+        dispatch_uid=f"store_catalog_post_save_{model.__name__}",
+    )
+    post_delete.connect(
+        invalidate_store_catalog,
+        sender=model,
+        dispatch_uid=f"store_catalog_post_delete_{model.__name__}",
+    )
+
+post_save.connect(
+    invalidate_store_catalog_on_location_change,
+    sender=Location,
+    dispatch_uid="store_catalog_post_save_Location",
+)
+post_save.connect(
+    invalidate_store_catalog_on_photo_change,
+    sender=User,
+    dispatch_uid="store_catalog_post_save_User",
+)
+pre_delete.connect(
+    mark_store_location_delete,
+    sender=Location,
+    dispatch_uid="store_catalog_pre_delete_Location",
+)
+post_delete.connect(
+    invalidate_store_catalog_on_location_delete,
+    sender=Location,
+    dispatch_uid="store_catalog_post_delete_Location",
+)
+
+
+def update_store_rating_on_review_delete(sender, instance, **kwargs):
+    update_store_rating(instance.store_id, -instance.rating, -1)
+
+
+post_delete.connect(
+    update_store_rating_on_review_delete,
+    sender=StoreReview,
+    dispatch_uid="store_rating_post_delete_StoreReview",
+)
+
+
+def update_store_unpaid_amount_on_purchase_delete(sender, instance, **kwargs):
+    purchase_values = {
+        "status": instance.status,
+        "store_id": instance.store_id,
+        "store_payment_id": instance.store_payment_id,
+    }
+    if is_unpaid_delivery(purchase_values):
+        update_store_unpaid_amount(instance.store_id, -instance.amount)
+
+
+def update_store_unpaid_amount_on_payment_delete(sender, instance, **kwargs):
+    # The settled purchases are left without a payment, so they're owed again
+    settled_purchases = instance.purchases.filter(status=Purchase.Status.DELIVERED)
+    settled_by_store = settled_purchases.values("store").annotate(total=Sum("amount"))
+    for settled in settled_by_store.order_by():
+        if settled["store"] is not None:
+            update_store_unpaid_amount(settled["store"], settled["total"])
+
+
+post_delete.connect(
+    update_store_unpaid_amount_on_purchase_delete,
+    sender=Purchase,
+    dispatch_uid="store_unpaid_amount_post_delete_Purchase",
+)
+pre_delete.connect(
+    update_store_unpaid_amount_on_payment_delete,
+    sender=StorePayment,
+    dispatch_uid="store_unpaid_amount_pre_delete_StorePayment",
+)
@@ -13,6 +13,7 @@ from stores import models as stores_models
 from stores import serializers as stores_serializers
 
 
+from common.pagination import OptionalKeysetPagination
 from common.permissions import (
     IsNaturalPersonUser,
     IsVerifiedStoreUser,
@@ -21,7 +22,12 @@ from common.permissions import (
 from users.models import User
 from users.serializers import UserSerializer
 
-from stores.api.store_balance import calculate_store_balance
+from stores.api.schedules import (
+    caracas_now,
+    get_open_now,
+    open_now_filter,
+    prefetch_schedule_today,
+)
 
 
 # Create your views here.
@@ -35,8 +41,22 @@ class StoreViewSet(viewsets.ModelViewSet):
 
         return super().get_serializer_class()
 
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Schedules are checked against the same moment for every store
+        self.now = caracas_now()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context.update({"now": self.now})
+        return context
+
     def get_queryset(self):
         queryset = stores_models.Store.objects.select_related("user", "location").all()
+        queryset = prefetch_schedule_today(queryset, self.now)
+        if get_open_now(self.request.query_params):
+            queryset = queryset.filter(open_now_filter(self.now))
+
         store_name = self.request.query_params.get("name", None)
         if store_name is None:
             return queryset
@@ -52,9 +72,7 @@ class StoreViewSet(viewsets.ModelViewSet):
     )
     def my_balance(self, request):
         store = request.user.store
-        balances_by_store = calculate_store_balance(store.id)
-        store_balance = balances_by_store.get(store=store.id)
-        return Response({"balance": store_balance.balance}, status=status.HTTP_200_OK)
+        return Response({"balance": store.unpaid_balance}, status=status.HTTP_200_OK)
 
 
 class StoreHasProductViewSet(viewsets.ModelViewSet):
@@ -144,6 +162,7 @@ class ProductViewSet(viewsets.GenericViewSet, mixins.ListModelMixin):
 
 class PurchaseViewSet(viewsets.ModelViewSet):
     serializer_class = stores_serializers.PurchaseSerializer
+    pagination_class = OptionalKeysetPagination
 
     def get_permissions(self):
         if self.action in [
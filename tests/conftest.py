@@ -7,6 +7,7 @@ from decimal import Decimal
 from faker import Faker
 from uuid import uuid4
 
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 
@@ -21,6 +22,12 @@ fake = Faker()
 Faker.seed(54321)
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    "Keeps cached data, like the store catalog, from leaking between tests"
+    cache.clear()
+
+
 @pytest.fixture
 def admin_user(db):
     data = {
@@ -0,0 +1,131 @@
+import pytest
+
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from administration.api.commissions import (
+    get_daily_commissions,
+    get_rollup_start_day,
+    get_total_commissions,
+    rollup_commissions,
+)
+from administration.models import CommissionRollup
+from stores.api.schedules import caracas_now
+from stores.models import Purchase
+from payments.models import Movement, StorePayment
+
+client = APIClient()
+
+
+@pytest.fixture
+def commissioned_purchases(store, make_purchase):
+    store_payment = StorePayment.objects.create(
+        store=store,
+        amount=Decimal("90.00"),
+        receipt="stores/receipt.png",
+        usd_exchange_rate=Decimal("10.00"),
+    )
+    settled = make_purchase(
+        {
+            "status": Purchase.Status.DELIVERED,
+            "amount": Decimal("100.00"),
+            "commission_percentage": Decimal("0.10"),
+        }
+    )
+    settled.store_payment = store_payment
+    settled.save()
+    refunded = make_purchase(
+        {
+            "status": Purchase.Status.REJECTED,
+            "amount": Decimal("50.00"),
+            "commission_percentage": Decimal("0.20"),
+        }
+    )
+    Movement.objects.create(
+        purchase=refunded, movement_type=Movement.Type.GIFT_REFUNDED, grouping_id=0
+    )
+    return settled, refunded
+
+
+@pytest.mark.django_db
+@patch("administration.views.usd_exchange_rate_service")
+def test_commissions_total(exchange_mock, admin_user, commissioned_purchases):
+    exchange_mock.get_usd_exchange_rate.return_value = Decimal(str(10.0))
+
+    client.force_authenticate(user=admin_user)
+    response = client.get(reverse("admin-commissions"))
+    data = response.data
+
+    assert response.status_code == status.HTTP_200_OK
+    assert data["commissions_total"] == Decimal("20.00")
+    assert data["commissions_total_local_currency"] == Decimal("200.00")
+
+    response = client.get(reverse("admin-commissions-daily"))
+    today = response.data["results"][0]
+    assert today["settled"] == Decimal("10.00")
+    assert today["refunded"] == Decimal("10.00")
+    assert today["total"] == Decimal("20.00")
+
+
+@pytest.mark.django_db
+def test_commissions_read_from_rollups(commissioned_purchases):
+    today = caracas_now().date()
+    rollup_commissions(today, today)
+    assert CommissionRollup.objects.filter(day=today).count() == 2
+
+    tomorrow = caracas_now() + timedelta(days=1)
+    with patch("administration.api.commissions.caracas_now") as caracas_now_mock:
+        caracas_now_mock.return_value = tomorrow
+        # Rolled up days aren't calculated again
+        Purchase.objects.filter(status=Purchase.Status.REJECTED).update(amount=0)
+        assert get_total_commissions() == Decimal("20.00")
+        assert get_total_commissions(start_day=tomorrow.date()) == 0
+
+
+@pytest.mark.django_db
+def test_days_without_rollups_calculated_on_demand(commissioned_purchases):
+    today = caracas_now().date()
+    later = caracas_now() + timedelta(days=5)
+    with patch("administration.api.commissions.caracas_now") as caracas_now_mock:
+        caracas_now_mock.return_value = later
+        # Only days after the commissions were rolled up, today's are missing
+        last_day = later.date() - timedelta(days=1)
+        rollup_commissions(last_day - timedelta(days=2), last_day)
+
+        daily_commissions = get_daily_commissions()
+        assert sum(daily_commissions[today].values()) == Decimal("20.00")
+        assert get_total_commissions() == Decimal("20.00")
+
+
+@pytest.mark.django_db
+def test_rollup_start_day(commissioned_purchases):
+    today = caracas_now().date()
+    end_day = today + timedelta(days=9)
+    # Nothing rolled up yet, the whole history is
+    assert get_rollup_start_day(end_day) == today
+
+    rollup_commissions(today, today + timedelta(days=2))
+    # The days after the last rolled up one, beyond the lookback window
+    assert get_rollup_start_day(end_day) == today + timedelta(days=3)
+
+
+@pytest.mark.django_db
+def test_refunds_dated_by_refund_movement(commissioned_purchases):
+    _, refunded = commissioned_purchases
+    today = caracas_now().date()
+    tomorrow = caracas_now() + timedelta(days=1)
+    with patch("django.utils.timezone.now") as now_mock:
+        now_mock.return_value = tomorrow
+        # Saving the purchase again doesn't move its refund to another day
+        refunded.save()
+
+    daily_commissions = get_daily_commissions(today, tomorrow.date())
+    refunded_source = CommissionRollup.Source.REFUNDED
+    assert daily_commissions[today][refunded_source] == Decimal("10.00")
+    assert refunded_source not in daily_commissions.get(tomorrow.date(), {})
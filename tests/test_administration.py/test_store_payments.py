@@ -3,7 +3,11 @@ import pytest
 from decimal import Decimal
 from datetime import datetime, timezone
 from unittest.mock import patch
+from redis.exceptions import ConnectionError as RedisConnectionError
 
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import override_settings
@@ -14,9 +18,10 @@ from rest_framework.test import APIClient
 from common.utils import round_to_fixed_exponent
 
 from stores.api.store_balance import calculate_store_balance
-from stores.models import Purchase, PurchaseHasProduct
-from payments.models import StorePayment
-from administration.models import FundAccount
+from stores.models import Store, Purchase, PurchaseHasProduct
+from payments.managers import STORE_PAYMENT_REFERENCE_COUNTER
+from payments.models import Counter, StorePayment, StoreFundAccount
+from administration.models import FundAccount, StoreBalanceSnapshot
 
 
 client = APIClient()
@@ -292,3 +297,214 @@ def test_created_payments_reference_numbers(
     payment2 = StorePayment.objects.get(pk=data2["id"])
     payment1.receipt.delete()
     payment2.receipt.delete()
+
+
+@pytest.mark.django_db
+@patch("administration.views.usd_exchange_rate_service")
+def test_store_unpaid_amount_follows_deliveries_and_payments(
+    exchange_mock, test_image, admin_user, fund_account, store, purchase
+):
+    exchange_mock.get_usd_exchange_rate.return_value = Decimal(str(10.0))
+
+    fund_account.balance = 200.00
+    fund_account.save()
+
+    store.refresh_from_db()
+    assert store.unpaid_amount == 0
+
+    purchase.status = Purchase.Status.DELIVERED
+    purchase.amount = Decimal("125.13")
+    purchase.save()
+
+    store.refresh_from_db()
+    assert store.unpaid_amount == Decimal("125.13")
+
+    payload = {
+        "store": store.id,
+        "receipt": test_image,
+        "funds_account_origin": fund_account.id,
+    }
+    client.force_authenticate(user=admin_user)
+    url = reverse("adminstorepayment-list")
+    response = client.post(url, payload)
+    assert response.status_code == status.HTTP_201_CREATED
+
+    store.refresh_from_db()
+    assert store.unpaid_amount == 0
+
+
+@pytest.mark.django_db
+def test_reconcile_store_balances(store, make_purchase):
+    make_purchase({"status": Purchase.Status.DELIVERED, "amount": Decimal("20.00")})
+    Store.objects.filter(pk=store.pk).update(unpaid_amount=Decimal("5.00"))
+
+    call_command("reconcile_store_balances", "--fix")
+
+    store.refresh_from_db()
+    assert store.unpaid_amount == Decimal("20.00")
+
+
+@pytest.mark.django_db
+@patch("administration.views.usd_exchange_rate_service")
+def test_list_payments_totals(exchange_mock, admin_user, store, make_purchase):
+    exchange_mock.get_usd_exchange_rate.return_value = Decimal(str(10.0))
+    for amount in [Decimal("10.00"), Decimal("20.00")]:
+        StorePayment.objects.create(
+            store=store,
+            amount=amount,
+            receipt="stores/receipt.png",
+            usd_exchange_rate=Decimal("10.00"),
+        )
+
+    client.force_authenticate(user=admin_user)
+    url = reverse("adminstorepayment-list")
+    data = client.get(url).data
+    assert data["total_paid"] == Decimal("30.00")
+    assert data["total_paid_local_currency"] == Decimal("300.00")
+    assert data["total_unpaid"] == 0
+
+    make_purchase({"status": Purchase.Status.DELIVERED, "amount": Decimal("5.00")})
+    data = client.get(url).data
+    assert data["total_unpaid"] == Decimal("5.00")
+
+
+@pytest.mark.django_db
+@patch("payments.signals.invalidate_payout_totals")
+def test_payout_totals_invalidated_on_delivery_and_payment(
+    invalidate_mock, store, make_purchase
+):
+    purchase = make_purchase({"status": Purchase.Status.PENDING})
+    store.name = "Renamed store"
+    store.save()
+    invalidate_mock.assert_not_called()
+
+    purchase.status = Purchase.Status.DELIVERED
+    purchase.save()
+    invalidate_mock.assert_called()
+
+    invalidate_mock.reset_mock()
+    StorePayment.objects.create(
+        store=store,
+        amount=Decimal("10.00"),
+        receipt="stores/receipt.png",
+        usd_exchange_rate=Decimal("10.00"),
+    )
+    invalidate_mock.assert_called()
+
+
+@pytest.mark.django_db
+@patch("payments.api.payout_totals.cache")
+@patch("administration.views.usd_exchange_rate_service")
+def test_list_payments_totals_cache_unavailable(
+    exchange_mock, cache_mock, admin_user, store, make_purchase
+):
+    exchange_mock.get_usd_exchange_rate.return_value = Decimal(str(10.0))
+    cache_mock.get.side_effect = RedisConnectionError()
+    cache_mock.set.side_effect = RedisConnectionError()
+    make_purchase({"status": Purchase.Status.DELIVERED, "amount": Decimal("5.00")})
+
+    client.force_authenticate(user=admin_user)
+    response = client.get(reverse("adminstorepayment-list"))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["total_unpaid"] == Decimal("5.00")
+    assert response.data["total_paid"] == 0
+
+
+@pytest.mark.django_db
+@patch("administration.views.usd_exchange_rate_service")
+def test_stores_balance_snapshot_follows_writes(
+    exchange_mock, test_image, admin_user, fund_account, store, make_purchase
+):
+    exchange_mock.get_usd_exchange_rate.return_value = Decimal("10.0")
+    fund_account.balance = 100.00
+    fund_account.save()
+
+    store.commission_percentage = Decimal("0.20")
+    store.save()
+    StoreFundAccount.objects.create(
+        store=store, bank_name="Test Bank", number="0102", is_preferential=True
+    )
+    make_purchase({"status": Purchase.Status.DELIVERED, "amount": Decimal("50.00")})
+
+    client.force_authenticate(user=admin_user)
+    url = reverse("admin-stores-balance")
+    response = client.get(url)
+    [result] = response.json()["results"]
+    assert result["balance"] == 40
+    assert isinstance(result["balance"], float)
+    assert response.data["total"] == Decimal("40.00")
+    assert result["preferential_account"]["bank_name"] == "Test Bank"
+    assert result["last_payment_date"] is None
+
+    payload = {
+        "store": store.id,
+        "receipt": test_image,
+        "funds_account_origin": fund_account.id,
+    }
+    response = client.post(reverse("adminstorepayment-list"), payload)
+    assert response.status_code == status.HTTP_201_CREATED
+
+    snapshot = StoreBalanceSnapshot.objects.get(store=store)
+    assert snapshot.balance == 0
+    assert snapshot.last_payment_date is not None
+
+    response = client.get(url)
+    assert response.data["count"] == 0
+
+
+@pytest.mark.django_db
+def test_pending_store_payments_query_count(
+    admin_user, store, make_purchase, products_in_store
+):
+    def make_delivered_purchase():
+        purchase = make_purchase({"status": Purchase.Status.DELIVERED})
+        PurchaseHasProduct.objects.bulk_create(
+            [
+                PurchaseHasProduct(
+                    purchase=purchase, product=store_product.product, quantity=2
+                )
+                for store_product in products_in_store
+            ]
+        )
+
+    client.force_authenticate(user=admin_user)
+    url = reverse("admin-stores-payments-pending", kwargs={"store_id": store.id})
+
+    make_delivered_purchase()
+    with CaptureQueriesContext(connection) as few_purchases_queries:
+        response = client.get(url)
+    assert len(response.data) == 1
+    products = sorted(response.data[0]["products"], key=lambda product: product["id"])
+    assert products == [
+        {"id": product.id, "name": product.name, "quantity": 2}
+        for product in sorted(
+            (store_product.product for store_product in products_in_store),
+            key=lambda product: product.id,
+        )
+    ]
+
+    for _ in range(4):
+        make_delivered_purchase()
+    with CaptureQueriesContext(connection) as many_purchases_queries:
+        response = client.get(url)
+    assert len(response.data) == 5
+
+    assert len(many_purchases_queries) == len(few_purchases_queries)
+
+
+@pytest.mark.django_db
+def test_store_payment_reference_counter_seeded_from_payments(store):
+    Counter.objects.filter(name=STORE_PAYMENT_REFERENCE_COUNTER).delete()
+    data = {
+        "store": store,
+        "amount": Decimal("10.00"),
+        "receipt": "stores/receipt.png",
+        "usd_exchange_rate": Decimal("10.00"),
+    }
+    StorePayment.objects.bulk_create([StorePayment(reference=41, **data)])
+
+    payment = StorePayment.objects.create(**data)
+    assert payment.reference_number == "000042"
+
+    payment = StorePayment.objects.create(**data)
+    assert payment.reference_number == "000043"
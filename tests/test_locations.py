@@ -1,11 +1,22 @@
 import pytest
+import pytz
+from datetime import datetime, time
+from unittest.mock import patch
+from haversine import haversine
+from redis.exceptions import ConnectionError as RedisConnectionError
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from locations.models import Location
+from stores.models import Store, StoreHasProduct, ScheduleDay
+from locations.api.distance import BatchDistance
+from common.serializers import encode_cursor
+from stores.api.catalog import get_catalog, invalidate_catalog
 
 client = APIClient()
 
@@ -110,7 +121,8 @@ def test_products_near_user(
     data = response.data
 
     assert response.status_code == status.HTTP_200_OK
-    assert len(data) == 4
+    assert data["count"] == 4
+    assert len(data["results"]) == 4
 
 
 @pytest.mark.django_db
@@ -135,3 +147,275 @@ def test_promotions_near_user(user, store, make_promotion, make_location):
 
     assert response.status_code == status.HTTP_200_OK
     assert data["count"] == 5
+
+
+def test_batch_distances_match_haversine():
+    origin = (10.151725, -64.634667)
+    destinations = [(10.150811, -64.633939), (12.150811, -68.633939), origin]
+    engine = BatchDistance(origin)
+    distances = engine.distances(destinations)
+
+    for destination, distance in zip(destinations, distances):
+        assert distance == pytest.approx(haversine(origin, destination))
+
+    assert list(engine.within_radius(distances, 50)) == [True, False, True]
+    assert list(engine.nearest(distances)) == [2, 0, 1]
+    assert list(engine.nearest(distances, k=2)) == [2, 0]
+
+
+@pytest.mark.django_db
+def test_products_near_user_best_offer_within_radius(
+    user, make_user, make_store, make_product, make_location
+):
+    product = make_product()
+    nearby_location = make_location({"latitude": 10.150811, "longitude": -64.633939})
+    faraway_location = make_location({"latitude": 12.150811, "longitude": -68.633939})
+
+    nearby_store = make_store({"user": make_user(), "location": nearby_location})
+    faraway_store = make_store({"user": make_user(), "location": faraway_location})
+    Store.objects.filter(pk__in=[nearby_store.pk, faraway_store.pk]).update(
+        verified=True
+    )
+    StoreHasProduct.objects.create(store=nearby_store, product=product, price=20)
+    StoreHasProduct.objects.create(store=faraway_store, product=product, price=5)
+
+    client.force_authenticate(user=user)
+    url = reverse("locations_products_nearby")
+    query_string = "?searchRadius=50&latitude=10.151725&longitude=-64.634667"
+    response = client.get(url + query_string, format="json")
+    data = response.data
+
+    assert response.status_code == status.HTTP_200_OK
+    assert data["count"] == 1
+    best_offer = data["results"][0]["best_offer"]
+    assert best_offer["store"]["id"] == nearby_store.id
+    assert best_offer["price"] == "20.00"
+
+
+@pytest.mark.django_db
+def test_promotions_near_user_query_count(user, store, make_promotion, make_location):
+    store.location = make_location({"latitude": 10.150811, "longitude": -64.633939})
+    store.verified = True
+    store.save()
+    make_promotion()
+
+    client.force_authenticate(user=user)
+    url = reverse("locations_promotions_nearby")
+    query_string = "?searchRadius=50&latitude=10.151725&longitude=-64.634667"
+    # Build the store catalog before counting queries
+    client.get(url + query_string, format="json")
+    with CaptureQueriesContext(connection) as few_promotions_queries:
+        response = client.get(url + query_string, format="json")
+    assert response.data["count"] == 1
+
+    for i in range(10):
+        make_promotion()
+
+    with CaptureQueriesContext(connection) as many_promotions_queries:
+        response = client.get(url + query_string, format="json")
+    assert response.data["count"] == 11
+
+    assert len(many_promotions_queries) == len(few_promotions_queries)
+
+
+@pytest.mark.django_db
+def test_stores_near_user_cursor_pagination(user, make_user, make_store, make_location):
+    coordinates = [(10.150811, -64.633939), (10.160811, -64.633939), (10.2, -64.6)]
+    stores = []
+    for latitude, longitude in coordinates:
+        location = make_location({"latitude": latitude, "longitude": longitude})
+        stores.append(make_store({"user": make_user(), "location": location}))
+    Store.objects.filter(pk__in=[store.pk for store in stores]).update(verified=True)
+
+    client.force_authenticate(user=user)
+    url = reverse("locations_stores_nearby")
+    query_string = "?searchRadius=50&latitude=10.151725&longitude=-64.634667"
+    response = client.get(url + query_string + "&pageSize=1", format="json")
+    first_page = response.data
+
+    assert first_page["count"] == 3
+    assert first_page["next"] == 2
+    assert first_page["results"][0]["store"]["id"] == stores[0].id
+
+    cursor = first_page["next_cursor"]
+    response = client.get(url + query_string + f"&pageSize=2&after={cursor}")
+    second_page = response.data
+
+    assert [result["store"]["id"] for result in second_page["results"]] == [
+        stores[1].id,
+        stores[2].id,
+    ]
+    assert second_page["next_cursor"] is None
+
+    for key in (["a"], [False, 1.5], [False, 1.5, 7, 8]):
+        cursor = encode_cursor(key)
+        response = client.get(url + query_string + f"&after={cursor}")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_stores_near_user_catalog_invalidation(user, store, make_location):
+    store.location = make_location({"latitude": 10.150811, "longitude": -64.633939})
+    store.verified = True
+    store.save()
+
+    client.force_authenticate(user=user)
+    url = reverse("locations_stores_nearby")
+    query_string = "?searchRadius=50&latitude=10.151725&longitude=-64.634667"
+    response = client.get(url + query_string, format="json")
+    assert response.data["results"][0]["store"]["name"] == store.name
+
+    store.name = "Renamed store"
+    store.save()
+    response = client.get(url + query_string, format="json")
+    assert response.data["results"][0]["store"]["name"] == "Renamed store"
+
+    store.verified = False
+    store.save()
+    response = client.get(url + query_string, format="json")
+    assert response.data["count"] == 0
+
+
+@pytest.mark.django_db
+@patch("stores.api.catalog.cache")
+def test_stores_near_user_cache_unavailable(cache_mock, user, store, make_location):
+    cache_mock.get.side_effect = RedisConnectionError()
+    cache_mock.set.side_effect = RedisConnectionError()
+    store.location = make_location({"latitude": 10.150811, "longitude": -64.633939})
+    store.verified = True
+    store.save()
+
+    client.force_authenticate(user=user)
+    url = reverse("locations_stores_nearby")
+    query_string = "?searchRadius=50&latitude=10.151725&longitude=-64.634667"
+    response = client.get(url + query_string, format="json")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["results"][0]["store"]["name"] == store.name
+
+
+@pytest.mark.django_db
+@patch("stores.signals.invalidate_catalog")
+def test_store_location_delete_invalidates_catalog(
+    invalidate_catalog_mock, store, make_location
+):
+    unused_location = make_location({"latitude": 10.150811, "longitude": -64.633939})
+    unused_location.delete()
+    invalidate_catalog_mock.assert_not_called()
+
+    store.location = make_location({"latitude": 10.150811, "longitude": -64.633939})
+    store.save()
+    invalidate_catalog_mock.reset_mock()
+    store.location.delete()
+    invalidate_catalog_mock.assert_called()
+
+
+@pytest.mark.django_db
+@patch("stores.signals.invalidate_catalog")
+def test_store_catalog_invalidated_on_catalog_fields_only(
+    invalidate_catalog_mock, user, store
+):
+    store.description = "Another description"
+    store.save()
+    user.photo = "users/person.png"
+    user.save()
+    invalidate_catalog_mock.assert_not_called()
+
+    store.name = "Renamed store"
+    store.save(update_fields=["name"])
+    invalidate_catalog_mock.assert_called()
+
+    invalidate_catalog_mock.reset_mock()
+    store.user.photo = "users/store.png"
+    store.user.save()
+    invalidate_catalog_mock.assert_called()
+
+
+@pytest.mark.django_db
+@patch("stores.api.catalog.cache")
+def test_store_catalog_kept_while_cache_unavailable(cache_mock, store):
+    cache_mock.get.side_effect = RedisConnectionError()
+    cache_mock.set.side_effect = RedisConnectionError()
+    invalidate_catalog()
+
+    catalog = get_catalog()
+    assert get_catalog() is catalog
+
+    store.name = "Renamed store"
+    store.save()
+    assert get_catalog() is not catalog
+
+
+@pytest.mark.django_db
+@patch("locations.api.locations.caracas_now")
+def test_stores_near_user_open_now(
+    caracas_now_mock, user, make_user, make_store, make_location
+):
+    caracas_now_mock.return_value = pytz.timezone("America/Caracas").localize(
+        datetime(2024, 1, 1, 23, 0)
+    )
+    stores = []
+    for open_hour, close_hour in [(time(9), time(17)), (time(20), time(2))]:
+        location = make_location({"latitude": 10.150811, "longitude": -64.633939})
+        store = make_store({"user": make_user(), "location": location})
+        store.verified = True
+        store.save()
+        ScheduleDay.objects.create(
+            store=store,
+            day=ScheduleDay.WeekDay.MONDAY,
+            open_hour=open_hour,
+            close_hour=close_hour,
+        )
+        stores.append(store)
+
+    client.force_authenticate(user=user)
+    url = reverse("locations_stores_nearby")
+    query_string = "?searchRadius=50&latitude=10.151725&longitude=-64.634667"
+    response = client.get(url + query_string + "&open_now=true", format="json")
+    data = response.data
+
+    assert data["count"] == 1
+    assert data["results"][0]["store"]["id"] == stores[1].id
+    assert data["results"][0]["store"]["schedule_today"]["closed"] is False
+
+
+@pytest.mark.django_db
+def test_product_prices_ranked_within_radius(
+    user, make_user, make_store, make_product, make_location
+):
+    product = make_product()
+    offers = [
+        ((10.150811, -64.633939), 30),
+        ((10.160811, -64.633939), 10),
+        ((12.150811, -68.633939), 5),
+    ]
+    stores = []
+    for (latitude, longitude), price in offers:
+        location = make_location({"latitude": latitude, "longitude": longitude})
+        store = make_store({"user": make_user(), "location": location})
+        store.verified = True
+        store.save()
+        StoreHasProduct.objects.create(store=store, product=product, price=price)
+        stores.append(store)
+
+    client.force_authenticate(user=user)
+    url = reverse("locations_product_prices", args=[product.id])
+    query_string = "?latitude=10.151725&longitude=-64.634667"
+    response = client.get(url + query_string, format="json")
+    data = response.data
+
+    assert data["count"] == 3
+    assert [price["store"]["id"] for price in data["results"]] == [
+        stores[2].id,
+        stores[1].id,
+        stores[0].id,
+    ]
+
+    response = client.get(url + query_string + "&searchRadius=50", format="json")
+    data = response.data
+
+    assert data["count"] == 2
+    assert data["results"][0]["store"]["id"] == stores[1].id
+    assert data["results"][0]["distance"] == pytest.approx(
+        haversine((10.151725, -64.634667), (10.160811, -64.633939))
+    )
@@ -1,22 +1,32 @@
+import csv
+import io
+import json
 import pytest
 
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from unittest.mock import patch
 
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
 
-from payments.models import Funding, Movement
+from payments.api.movements import MovementWriter
+from payments.managers import GROUPING_ID_COUNTER
+from payments.models import Counter, Funding, Movement
 from payments.serializers import (
     FundingSerializer,
 )
 from payments.views import MovementsView
 
-from stores.models import Purchase
+from stores.models import Purchase, PurchaseHasProduct
 from stores.serializers import PurchaseSerializer
 
+from administration.api.movements import get_time_range_bounds
 from administration.serializers import (
     FundOperationSerializer,
     AdminStorePaymentSerializer,
@@ -44,6 +54,8 @@ def movements(fundings):
         )
         for index, funding in enumerate(fundings)
     ]
+    for movement in data:
+        movement.set_owners()
     movements = Movement.objects.bulk_create(data)
     return movements
 
@@ -64,6 +76,82 @@ def test_get_user_movements(funding_get_payment_mock, user, movements):
     assert data["count"] == expected_movements_count
 
 
+def get_user_movement_types(user, **params):
+    request = request_factory.get("beers/movements/", params)
+    force_authenticate(request, user)
+    view = MovementsView.as_view({"get": "list"})
+    response = view(request)
+    assert response.status_code == status.HTTP_200_OK
+    return sorted(movement["movement_type"] for movement in response.data["results"])
+
+
+@pytest.mark.django_db
+def test_user_movements_feed_by_owner(user, user2, system_usd, purchase):
+    sent, received, rejected = [
+        Movement.objects.create(
+            purchase=purchase, movement_type=movement_type, grouping_id=0
+        )
+        for movement_type in [
+            Movement.Type.GIFT_SENT,
+            Movement.Type.GIFT_RECEIVED,
+            Movement.Type.GIFT_REJECTED,
+        ]
+    ]
+
+    assert (sent.owner_user, sent.counterparty_user) == (user, user2)
+    assert (received.owner_user, received.counterparty_user) == (user2, user)
+    assert (rejected.owner_user, rejected.counterparty_user) == (user, user2)
+
+    assert get_user_movement_types(user) == ["GIFT_REJECTED", "GIFT_SENT"]
+    assert get_user_movement_types(user2) == ["GIFT_REJECTED"]
+    assert get_user_movement_types(user2, gift_accepted_received_only=True) == [
+        "GIFT_RECEIVED"
+    ]
+
+
+@pytest.mark.django_db
+@patch("payments.serializers.FundingSerializer.get_payment_method")
+def test_user_movements_keyset_pagination(funding_get_payment_mock, user):
+    funding_get_payment_mock.return_value = "**** **** **** 4242"
+    fundings = Funding.objects.bulk_create(
+        [
+            Funding(user=user, amount=1.00, reference=f"payment_intent_{i}", fee=0.00)
+            for i in range(20)
+        ]
+    )
+    movements = [
+        Movement(funding=funding, movement_type=Movement.Type.FUNDING, grouping_id=i)
+        for i, funding in enumerate(fundings)
+    ]
+    for movement in movements:
+        movement.set_owners()
+    Movement.objects.bulk_create(movements)
+
+    client.force_authenticate(user=user)
+    url = reverse("movements-list")
+
+    response = client.get(url, {"pagination": "cursor"}, format="json")
+    assert response.status_code == status.HTTP_200_OK
+    assert "count" not in response.data
+    first_page = [movement["id"] for movement in response.data["results"]]
+    assert len(first_page) == 15
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(response.data["next"], format="json")
+    assert not any("COUNT(" in query["sql"] for query in queries)
+    second_page = [movement["id"] for movement in response.data["results"]]
+    assert response.data["next"] is None
+
+    expected = sorted(Movement.objects.values_list("created_at", "id"), reverse=True)
+    assert first_page + second_page == [movement_id for _, movement_id in expected]
+
+    response = client.get(url, {"after": "not-a-cursor"}, format="json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = client.get(url, format="json")
+    assert response.data["count"] == 20
+
+
 @pytest.mark.django_db
 def test_GIFT_SENT_and_GIFT_RECEIVED_created_for_purchase(
     store_user, user, products, promotions, relate_product_to_store
@@ -268,3 +356,229 @@ def test_FUNDS_EXCHANGE_created_for_admin_funds_transfer(admin_user, fund_accoun
         admin_operation=operation,
     )
     assert mov1.grouping_id == mov2.grouping_id
+
+
+@pytest.fixture
+def make_gift_movements(make_purchase, make_funding, products_in_store):
+    def __make_gift_movements(count):
+        for i in range(count):
+            purchase = make_purchase()
+            PurchaseHasProduct.objects.bulk_create(
+                [
+                    PurchaseHasProduct(
+                        purchase=purchase, product=store_product.product, quantity=i + 1
+                    )
+                    for store_product in products_in_store
+                ]
+            )
+            Movement.objects.create(
+                purchase=purchase,
+                movement_type=Movement.Type.GIFT_SENT,
+                grouping_id=i,
+            )
+            Movement.objects.create(
+                funding=make_funding(),
+                movement_type=Movement.Type.FUNDING,
+                grouping_id=i,
+            )
+
+    return __make_gift_movements
+
+
+@pytest.mark.django_db
+def test_admin_movements_query_count(admin_user, system_usd, make_gift_movements):
+    client.force_authenticate(user=admin_user)
+    url = reverse("admin-movements-list")
+
+    make_gift_movements(1)
+    with CaptureQueriesContext(connection) as few_movements_queries:
+        response = client.get(url, format="json")
+    assert response.data["count"] == 2
+
+    make_gift_movements(6)
+    with CaptureQueriesContext(connection) as many_movements_queries:
+        response = client.get(url, format="json")
+    assert response.data["count"] == 14
+
+    assert len(many_movements_queries) == len(few_movements_queries)
+
+    gift = next(
+        movement
+        for movement in response.data["results"]
+        if movement["movement_type"] == Movement.Type.GIFT_SENT
+    )
+    assert gift["gift_info"]["usd_exchange_rate"] == system_usd.ves_exchange_rate
+    assert len(gift["gift_info"]["products"]) == 3
+
+
+@pytest.mark.parametrize(
+    "time_range,today,expected_start,expected_end",
+    [
+        ("PREV_MONTH", date(2023, 1, 15), date(2022, 12, 1), date(2023, 1, 1)),
+        ("PREV_3_MONTHS", date(2023, 2, 10), date(2022, 12, 1), date(2023, 3, 1)),
+        ("PREV_3_MONTHS", date(2023, 12, 31), date(2023, 10, 1), date(2024, 1, 1)),
+        ("PREV_YEAR", date(2023, 6, 1), date(2023, 1, 1), date(2024, 1, 1)),
+    ],
+)
+def test_movements_time_range_bounds(time_range, today, expected_start, expected_end):
+    start, end = get_time_range_bounds(time_range, today)
+
+    assert start.date() == expected_start and end.date() == expected_end
+    assert start.hour == 0 and str(start.tzinfo) == "America/Caracas"
+
+
+@pytest.mark.django_db
+def test_admin_movements_date_range_in_caracas_time(admin_user, movements):
+    # 2023-03-01 02:00 UTC is still February 28th in Caracas
+    Movement.objects.filter(pk=movements[0].pk).update(
+        created_at=datetime(2023, 3, 1, 2, 0, tzinfo=timezone.utc)
+    )
+    Movement.objects.filter(pk=movements[1].pk).update(
+        created_at=datetime(2023, 3, 1, 5, 0, tzinfo=timezone.utc)
+    )
+
+    client.force_authenticate(user=admin_user)
+    url = reverse("admin-movements-list")
+    response = client.get(url, {"start_date": "2023-02-28", "end_date": "2023-02-28"})
+    assert response.status_code == status.HTTP_200_OK
+    assert [movement["id"] for movement in response.data["results"]] == [
+        movements[0].pk
+    ]
+
+    response = client.get(url, {"start_date": "2023-03-01"})
+    assert [movement["id"] for movement in response.data["results"]] == [
+        movements[1].pk
+    ]
+
+    response = client.get(url, {"end_date": "28-02-2023"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_admin_movements_username_search(
+    admin_user, system_usd, store, purchase, funding
+):
+    gift = Movement.objects.create(
+        purchase=purchase, movement_type=Movement.Type.GIFT_SENT, grouping_id=0
+    )
+    recharge = Movement.objects.create(
+        funding=funding, movement_type=Movement.Type.FUNDING, grouping_id=1
+    )
+    assert gift.actor_username == "natural_person"
+    assert gift.store_name == "my store name"
+    assert recharge.actor_username == "natural_person" and recharge.store_name == ""
+
+    client.force_authenticate(user=admin_user)
+    url = reverse("admin-movements-list")
+    response = client.get(url, {"username": "Natural"})
+    assert response.data["count"] == 2
+
+    response = client.get(url, {"username": "my store"})
+    assert [movement["id"] for movement in response.data["results"]] == [gift.pk]
+
+    response = client.get(url, {"username": "person"})
+    assert response.data["count"] == 0
+
+
+@pytest.mark.django_db
+def test_admin_movements_search_follows_renames(
+    admin_user, system_usd, user, store, purchase, funding
+):
+    Movement.objects.create(
+        purchase=purchase, movement_type=Movement.Type.GIFT_SENT, grouping_id=0
+    )
+    Movement.objects.create(
+        funding=funding, movement_type=Movement.Type.FUNDING, grouping_id=1
+    )
+
+    user.username = "Renamed_person"
+    user.save()
+    store.name = "Renamed store"
+    store.save()
+    assert set(Movement.objects.values_list("actor_username", flat=True)) == {
+        "renamed_person"
+    }
+    assert set(Movement.objects.values_list("store_name", flat=True)) == {
+        "renamed store",
+        "",
+    }
+
+    client.force_authenticate(user=admin_user)
+    url = reverse("admin-movements-list")
+    response = client.get(url, {"username": "renamed"})
+    assert response.data["count"] == 2
+
+
+@pytest.mark.django_db
+def test_admin_movements_export(admin_user, system_usd, make_gift_movements):
+    make_gift_movements(3)
+    client.force_authenticate(user=admin_user)
+    url = reverse("admin-movements-export")
+
+    response = client.get(url, {"movement_type": Movement.Type.GIFT_SENT})
+    assert response.status_code == status.HTTP_200_OK
+    assert response["Content-Type"] == "text/csv"
+    rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+    assert rows[0] == [
+        "id",
+        "created_at",
+        "movement_type",
+        "grouping_id",
+        "username",
+        "amount",
+        "amount_local_currency",
+        "commission_amount",
+    ]
+    assert len(rows) == 4
+    assert {row[2] for row in rows[1:]} == {Movement.Type.GIFT_SENT}
+
+    response = client.get(url, {"export_format": "ndjson"})
+    lines = b"".join(response.streaming_content).decode().splitlines()
+    movements = [json.loads(line) for line in lines]
+    assert len(movements) == 6
+    assert movements[0]["username"] == "natural_person"
+
+    response = client.get(url, {"export_format": "xlsx"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_grouping_ids_allocation():
+    first = Movement.objects.get_next_grouping_id()
+    grouping_ids = Movement.objects.allocate_grouping_ids(3)
+
+    assert list(grouping_ids) == [first + 1, first + 2, first + 3]
+    assert Movement.objects.get_next_grouping_id() == first + 4
+
+
+@pytest.mark.django_db
+def test_grouping_id_counter_seeded_from_movements(movements):
+    Counter.objects.filter(name=GROUPING_ID_COUNTER).delete()
+    last_grouping_id = max(movement.grouping_id for movement in movements)
+
+    assert Movement.objects.get_next_grouping_id() == last_grouping_id + 1
+
+
+@pytest.mark.django_db
+def test_movement_writer_inserts_groups_at_once(user, user2, purchase, funding):
+    movement_writer = MovementWriter()
+    movement_writer.add_group(
+        [Movement.Type.GIFT_SENT, Movement.Type.GIFT_RECEIVED], purchase=purchase
+    )
+    movement_writer.add_group([Movement.Type.FUNDING], funding=funding)
+
+    with CaptureQueriesContext(connection) as queries:
+        movement_writer.save()
+    movement_insert = f'INSERT INTO "{Movement._meta.db_table}"'
+    assert sum(query["sql"].startswith(movement_insert) for query in queries) == 1
+
+    sent = Movement.objects.get(movement_type=Movement.Type.GIFT_SENT)
+    received = Movement.objects.get(movement_type=Movement.Type.GIFT_RECEIVED)
+    funding_movement = Movement.objects.get(movement_type=Movement.Type.FUNDING)
+    assert sent.grouping_id == received.grouping_id != funding_movement.grouping_id
+    assert (received.owner_user, received.counterparty_user) == (user2, user)
+    assert funding_movement.owner_user == funding.user
+    assert sent.actor_username == user.username.lower()
+
+    with pytest.raises(ValidationError):
+        MovementWriter().add_group([Movement.Type.GIFT_CLAIMED], funding=funding)
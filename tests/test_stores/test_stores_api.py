@@ -1,8 +1,10 @@
 import pytest
-from datetime import datetime, timezone
+import pytz
+from datetime import datetime, timezone, time
 from decimal import Decimal, ROUND_UP
 from unittest.mock import patch
 
+from django.core.management import call_command
 from django.urls import reverse
 
 from rest_framework import status
@@ -10,7 +12,16 @@ from rest_framework.test import APIClient
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.test import APIRequestFactory, force_authenticate
 
+from stores.models import (
+    Store,
+    StoreReview,
+    ScheduleDay,
+    DispatchCode,
+    generate_dispatch_code,
+    DispatchCodesExhausted,
+)
 from stores.views import PurchaseViewSet, StoreViewSet
+from locations.models import Location
 
 from common.permissions import IsAdminOrVerifiedStoreUser
 
@@ -54,3 +65,92 @@ def test_get_stores_balance_store_user_permissions(store):
     response = client.get(url)
 
     assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+def test_store_rating_follows_reviews(store, make_user):
+    review = StoreReview.objects.create(
+        store=store, user=make_user(), rating=4, content="Good"
+    )
+    StoreReview.objects.create(store=store, user=make_user(), rating=1, content="Bad")
+    store.refresh_from_db()
+    assert store.reviews_count == 2
+    assert store.rating == 2.5
+
+    review.rating = 5
+    review.save()
+    store.refresh_from_db()
+    assert store.reviews_count == 2
+    assert store.rating == 3.0
+
+    review.delete()
+    store.refresh_from_db()
+    assert store.reviews_count == 1
+    assert store.rating == 1.0
+
+
+@pytest.mark.django_db
+def test_recompute_store_ratings(store, make_user):
+    StoreReview.objects.create(store=store, user=make_user(), rating=3, content="Ok")
+    Store.objects.filter(pk=store.pk).update(rating_sum=0, rating_count=7)
+
+    call_command("recompute_store_ratings")
+    store.refresh_from_db()
+    assert store.reviews_count == 1
+    assert store.rating == 3.0
+
+
+@pytest.mark.django_db
+@patch("stores.views.caracas_now")
+def test_list_stores_open_now(caracas_now_mock, user, make_user, make_store):
+    caracas_now_mock.return_value = pytz.timezone("America/Caracas").localize(
+        datetime(2024, 1, 1, 12, 30)
+    )
+    monday = ScheduleDay.WeekDay.MONDAY
+
+    def make_located_store(name):
+        location = Location.objects.create(latitude=10.150811, longitude=-64.633939)
+        return make_store({"user": make_user(), "name": name, "location": location})
+
+    open_store = make_located_store("Open")
+    ScheduleDay.objects.create(
+        store=open_store, day=monday, open_hour=time(9), close_hour=time(17)
+    )
+    late_store = make_located_store("Late")
+    ScheduleDay.objects.create(
+        store=late_store, day=monday, open_hour=time(20), close_hour=time(2)
+    )
+    closed_store = make_located_store("Closed")
+    ScheduleDay.objects.create(
+        store=closed_store,
+        day=monday,
+        open_hour=time(9),
+        close_hour=time(17),
+        closed=True,
+    )
+
+    client.force_authenticate(user=user)
+    response = client.get(reverse("store-list") + "?open_now=true")
+    results = response.data["results"]
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [store["id"] for store in results] == [open_store.id]
+    assert results[0]["schedule_today"]["closed"] is False
+
+
+@pytest.mark.django_db
+def test_dispatch_codes_claimed_from_pool():
+    DispatchCode.objects.all().delete()
+    DispatchCode.objects.bulk_create(
+        [
+            DispatchCode(code="48213", position=0),
+            DispatchCode(code="00917", position=1),
+        ]
+    )
+
+    assert generate_dispatch_code() == "48213"
+    assert generate_dispatch_code() == "00917"
+    assert not DispatchCode.objects.exists()
+
+    with pytest.raises(DispatchCodesExhausted):
+        generate_dispatch_code()
@@ -6,7 +6,7 @@ from rest_framework import status
 
 from django.urls import reverse
 
-from stores.models import Store
+from stores.models import Store, DispatchCode
 
 client = APIClient()
 
@@ -59,3 +59,35 @@ def test_create_store_user(send_mail_mock, mock_code_generator):
 
     store = Store.objects.get(id=response.data["store"]["id"])
     assert store.dispatch_code == fake_dispatch_code
+
+
+@pytest.mark.django_db
+@patch("users.serializers.EmailMultiAlternatives")
+def test_create_store_user_claims_one_dispatch_code(send_mail_mock, system_usd):
+    DispatchCode.objects.all().delete()
+    DispatchCode.objects.bulk_create(
+        [
+            DispatchCode(code="48213", position=0),
+            DispatchCode(code="00917", position=1),
+        ]
+    )
+
+    payload = {
+        "email": "test@testing.com",
+        "password": "test_pwd",
+        "confirm_password": "test_pwd",
+        "username": "testing_store_user",
+        "type": "STR",
+        "store": {
+            "name": "I'm a testing store and this is my name!",
+            "phone": "+584161234567",
+            "description": "Testing store description",
+        },
+    }
+    url = reverse("user-list")
+    response = client.post(url, payload, format="json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    store = Store.objects.get(id=response.data["store"]["id"])
+    assert store.dispatch_code == "48213"
+    assert list(DispatchCode.objects.values_list("code", flat=True)) == ["00917"]